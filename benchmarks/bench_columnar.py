@@ -0,0 +1,83 @@
+"""
+Micro-benchmark: `TaxAggregates.compute` vs. the columnar `from_tables`.
+
+    python -m benchmarks.bench_columnar [documents]
+
+`from_tables` is timed twice: building the tables from the parsed models
+on every call, and over tables built once beforehand. Only the second
+beats the loop – which is why `compute` stays the default.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import timeit
+from typing import List, Tuple
+
+from parsers.columnar import ExpenseTable, InvoiceTable
+from parsers.expense_parser import ExpenseParser, ParsedExpense
+from parsers.invoice_parser import InvoiceParser, ParsedInvoice
+from xml_generators.aggregates import TaxAggregates
+
+
+def _sample(documents: int) -> Tuple[List[ParsedInvoice], List[ParsedExpense]]:
+    rng = random.Random(0)
+    invoices = []
+    expenses = []
+    for i in range(documents // 2):
+        base = rng.randrange(100, 5_000_000) / 100
+        vat = round(base * 0.21, 2)
+        invoices.append(
+            InvoiceParser.parse(
+                {
+                    "number": f"2024-{i:06d}",
+                    "issued_on": "2024-03-05",
+                    "subtotal": f"{base:.2f}",
+                    "total": f"{base + vat:.2f}",
+                    "vat_rates_summary": [{"vat_rate": 21, "base": f"{base:.2f}", "vat": f"{vat:.2f}"}],
+                }
+            )
+        )
+        rate = rng.choice((21, 12))
+        vat = round(base * rate / 100, 2)
+        expenses.append(
+            ExpenseParser.parse(
+                {
+                    "number": f"N{i}",
+                    "issued_on": "2024-03-05",
+                    "supplier_vat_no": "CZ11223344",
+                    "native_total": f"{base + vat:.2f}",
+                    "vat_rates_summary": [
+                        {"vat_rate": rate, "native_base": f"{base:.2f}", "native_vat": f"{vat:.2f}"}
+                    ],
+                }
+            )
+        )
+    return invoices, expenses
+
+
+def main() -> None:
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    invoices, expenses = _sample(documents)
+    invoice_table = InvoiceTable.from_parsed(invoices)
+    expense_table = ExpenseTable.from_parsed(expenses)
+    assert TaxAggregates.from_tables(invoices, expenses) == TaxAggregates.compute(invoices, expenses)
+
+    cases = [
+        ("compute (loop)", lambda: TaxAggregates.compute(invoices, expenses)),
+        ("from_tables, building tables", lambda: TaxAggregates.from_tables(invoices, expenses)),
+        (
+            "from_tables, prebuilt tables",
+            lambda: TaxAggregates.from_tables(invoices, expenses, invoice_table, expense_table),
+        ),
+    ]
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=5))
+        baseline = baseline or best
+        print(f"{name:32s} {best * 1e3:8.2f} ms  x{baseline / best:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: memoized `parsers.dates` vs. the former per-call parsing.
+
+    python -m benchmarks.bench_dates [rows]
+
+Dates are drawn from two years of days (as in a typical history), so most
+lookups hit the memo.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from parsers import dates
+
+
+def _former_parse_date(value: Optional[str]) -> Optional[datetime]:
+    # InvoiceParser/ExpenseParser._parse_date before parsers.dates
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value.split("T")[0])
+
+
+def _sample(rows: int) -> List[str]:
+    rng = random.Random(0)
+    start = date(2023, 1, 1)
+    return [(start + timedelta(days=rng.randrange(730))).isoformat() for _ in range(rows)]
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    values = _sample(rows)
+    assert [_former_parse_date(v) for v in values] == [dates.parse_date(v) for v in values]
+
+    def per_call_former() -> None:
+        for v in values:
+            _former_parse_date(v)
+
+    def per_call_memo() -> None:
+        for v in values:
+            dates.parse_date(v)
+
+    cases = [
+        ("former fromisoformat per call", per_call_former),
+        ("parse_date (memoized)", per_call_memo),
+    ]
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=5))
+        baseline = baseline or best
+        print(f"{name:32s} {best * 1e9 / rows:7.1f} ns/date  x{baseline / best:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,25 @@ FAKTUROID_USER_AGENT = os.getenv(
     "FAKTUROID_USER_AGENT",
     "tax-payer-tool (change-me@example.com)",
 )
+# Pages fetched ahead concurrently while paginating (0 = strictly serial)
+FAKTUROID_PREFETCH_PAGES = int(os.getenv("FAKTUROID_PREFETCH_PAGES", "0"))
+# Request pacing: requests per minute per account, retries on 429/5xx
+FAKTUROID_RATE_LIMIT = int(os.getenv("FAKTUROID_RATE_LIMIT", "400"))
+FAKTUROID_MAX_RETRIES = int(os.getenv("FAKTUROID_MAX_RETRIES", "5"))
+# On-disk cache of list responses, revalidated via ETag (empty = disabled)
+FAKTUROID_CACHE_DIR = os.getenv("FAKTUROID_CACHE_DIR", "")
+FAKTUROID_CACHE_MAX_MB = int(os.getenv("FAKTUROID_CACHE_MAX_MB", "200"))
+# Access tokens are reused across runs until expiry (empty = keep in memory only)
+FAKTUROID_TOKEN_FILE = os.getenv("FAKTUROID_TOKEN_FILE", "")
+# Local SQLite mirror of invoices/expenses (empty = always query the API)
+FAKTUROID_MIRROR_DB = os.getenv("FAKTUROID_MIRROR_DB", "")
+# Parse documents in this many worker processes (0 = in-process); streams
+# shorter than PARSE_PARALLEL_MIN_ROWS are parsed in-process anyway
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+PARSE_PARALLEL_MIN_ROWS = int(os.getenv("PARSE_PARALLEL_MIN_ROWS", "20000"))
+
+# Taxpayer profile file (KEY=value, same TAXPAYER_* keys as .env); empty = read env/.env
+TAXPAYER_PROFILE = os.getenv("TAXPAYER_PROFILE", "")
 
 # Tax portal
 TAX_PORTAL_USERNAME = os.getenv("TAX_PORTAL_USERNAME", "")
@@ -24,6 +43,9 @@ BANK_API_KEY = os.getenv("BANK_API_KEY", "")
 
 # Output
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "./output")
+# Validate generated DPH / KH against the EPO XSDs in XSD_DIR (empty = xml_generators/schemas)
+XML_VALIDATE = os.getenv("XML_VALIDATE", "false").lower() == "true"
+XSD_DIR = os.getenv("XSD_DIR", "")
 
 # Email settings
 EMAIL_SMTP_HOST = os.getenv("EMAIL_SMTP_HOST", "")
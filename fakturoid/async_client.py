@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from config.settings import (
+    FAKTUROID_CACHE_DIR,
+    FAKTUROID_CACHE_MAX_MB,
+    FAKTUROID_CLIENT_ID,
+    FAKTUROID_CLIENT_SECRET,
+    FAKTUROID_SLUG,
+    FAKTUROID_TOKEN_FILE,
+    FAKTUROID_USER_AGENT,
+)
+from fakturoid.cache import ResponseCache
+from fakturoid.client import FakturoidClient, RequestScheduler, build_list_params
+from fakturoid.token_store import StoredToken, TokenStore
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFakturoidClient:
+    """
+    asyncio counterpart of `FakturoidClient` (same methods, awaitable).
+    One instance per Fakturoid account; requests go through a pooled
+    aiohttp session, which can be shared across accounts via `session=`.
+    `cache` / `token_store` default to FAKTUROID_CACHE_DIR /
+    FAKTUROID_TOKEN_FILE when set, as in `FakturoidClient`.
+
+        async with AsyncFakturoidClient(slug="acme") as client:
+            rows = await client.iter_expenses_for_tax_month(start, end)
+    """
+
+    BASE_URL = FakturoidClient.BASE_URL
+    TOKEN_URL = FakturoidClient.TOKEN_URL
+
+    def __init__(
+        self,
+        slug: Optional[str] = None,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        connection_limit: int = 20,
+        cache: Optional[ResponseCache] = None,
+        token_store: Optional[TokenStore] = None,
+        scheduler: Optional[RequestScheduler] = None,
+    ) -> None:
+        self.slug = slug or FAKTUROID_SLUG
+        self.client_id = client_id or FAKTUROID_CLIENT_ID
+        self.client_secret = client_secret or FAKTUROID_CLIENT_SECRET
+        self.user_agent = user_agent or FAKTUROID_USER_AGENT
+
+        if not (self.slug and self.client_id and self.client_secret):
+            raise RuntimeError("Fakturoid OAuth2 credentials missing in environment/config")
+
+        self._session = session
+        self._owns_session = session is None
+        self._connection_limit = connection_limit
+        self._timeout = aiohttp.ClientTimeout(total=30)
+        if cache is None and FAKTUROID_CACHE_DIR:
+            cache = ResponseCache(
+                FAKTUROID_CACHE_DIR, max_bytes=FAKTUROID_CACHE_MAX_MB * 1024 * 1024
+            )
+        self.cache = cache
+        if token_store is None and FAKTUROID_TOKEN_FILE:
+            token_store = TokenStore(FAKTUROID_TOKEN_FILE)
+        self.token_store = token_store
+        self.scheduler = scheduler or RequestScheduler()
+
+        self._token: Optional[StoredToken] = None
+        # created on first use: on Python < 3.10 a Lock binds the loop current
+        # at construction, which may not be the one the client runs in
+        self._token_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "AsyncFakturoidClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._connection_limit),
+                timeout=self._timeout,
+            )
+        return self._session
+
+    def _url(self, path: str) -> str:
+        return f"{self.BASE_URL}/accounts/{self.slug}{path}"
+
+    def _base_headers(self) -> Dict[str, str]:
+        return {"User-Agent": self.user_agent, "Accept": "application/json"}
+
+    async def _ensure_token(self) -> StoredToken:
+        token = self._token
+        if token is not None and token.is_valid():
+            return token
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            # another task may have fetched it while we waited
+            if self._token is not None and self._token.is_valid():
+                return self._token
+            token = self.token_store.load(self.client_id) if self.token_store else None
+            if token is None:
+                token = await self._fetch_token()
+                if self.token_store is not None:
+                    self.token_store.save(self.client_id, token)
+            self._token = token
+            return token
+
+    async def _fetch_token(self) -> StoredToken:
+        headers = {
+            **self._base_headers(),
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        async with self.session.post(
+            self.TOKEN_URL,
+            data={"grant_type": "client_credentials"},
+            headers=headers,
+            auth=aiohttp.BasicAuth(self.client_id, self.client_secret),
+        ) as resp:
+            resp.raise_for_status()
+            payload = await resp.json(content_type=None)
+        return StoredToken.from_response(payload)
+
+    def _invalidate_token(self, rejected: StoredToken) -> None:
+        if self._token is rejected:
+            self._token = None
+            if self.token_store is not None:
+                self.token_store.invalidate(self.client_id, rejected.access_token)
+
+    async def _auth_headers(self, token: Optional[StoredToken] = None) -> Dict[str, str]:
+        token = token or await self._ensure_token()
+        return {
+            **self._base_headers(),
+            "Authorization": f"{token.token_type} {token.access_token}",
+        }
+
+    async def _get(self, url: str, **kwargs: Any) -> aiohttp.ClientResponse:
+        """GET through the scheduler, retrying 429 / 5xx and connection errors."""
+        attempt = 0
+        while True:
+            delay = self.scheduler.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                async with self.session.get(url, **kwargs) as resp:
+                    # read while the connection is held; body stays cached on resp
+                    await resp.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                wait = self.scheduler.retry_delay(attempt)
+                logger.warning("Fakturoid request failed (%s), retrying in %.1fs", exc, wait)
+            else:
+                self.scheduler.observe(resp.status, resp.headers)
+                if not self.scheduler.should_retry(resp.status, attempt):
+                    return resp
+                wait = self.scheduler.retry_delay(attempt, resp.headers)
+                logger.warning("Fakturoid returned %s, retrying in %.1fs", resp.status, wait)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def _get_list(
+        self,
+        path: str,
+        params: Dict[str, Any],
+        what: str,
+        conditional: bool = True,
+        retry_auth: bool = True,
+    ) -> List[Dict[str, Any]]:
+        token = await self._ensure_token()
+        headers = await self._auth_headers(token)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self.slug, path, params)
+            if conditional:
+                headers.update(self.cache.validators(cache_key))
+        resp = await self._get(self._url(path), headers=headers, params=params)
+        if resp.status == 401 and retry_auth:
+            # token revoked or expired early – get a new one and retry once
+            self._invalidate_token(token)
+            return await self._get_list(path, params, what, conditional, retry_auth=False)
+        if resp.status == 304 and cache_key is not None:
+            data = self.cache.get(cache_key)
+            if data is None:
+                # entry evicted since we read its validators
+                return await self._get_list(path, params, what, conditional=False)
+        else:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+            if cache_key is not None and isinstance(data, list):
+                self.cache.put(cache_key, resp.headers, data)
+        if not isinstance(data, list):
+            raise RuntimeError(f"Unexpected {what} response: {data!r}")
+        return data
+
+    async def list_invoices(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        page: int = 1,
+        updated_since: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        params = build_list_params(page, since, until, updated_since=updated_since)
+        return await self._get_list("/invoices.json", params, "invoices")
+
+    async def iter_invoice_pages(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        page = 1
+        while True:
+            chunk = await self.list_invoices(since=since, until=until, page=page)
+            if not chunk:
+                return
+            yield chunk
+            page += 1
+
+    async def stream_invoices(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async for chunk in self.iter_invoice_pages(since=since, until=until):
+            for row in chunk:
+                yield row
+
+    async def iter_invoices(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        return [row async for row in self.stream_invoices(since=since, until=until)]
+
+    async def list_expenses(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+        page: int = 1,
+        updated_since: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        params = build_list_params(page, since, until, status=status, updated_since=updated_since)
+        return await self._get_list("/expenses.json", params, "expenses")
+
+    async def iter_expense_pages(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        page = 1
+        while True:
+            chunk = await self.list_expenses(since=since, until=until, status=status, page=page)
+            if not chunk:
+                return
+            yield chunk
+            page += 1
+
+    async def stream_expenses(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async for chunk in self.iter_expense_pages(since=since, until=until, status=status):
+            for row in chunk:
+                yield row
+
+    async def iter_expenses(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+    ) -> List[Dict[str, Any]]:
+        return [
+            row async for row in self.stream_expenses(since=since, until=until, status=status)
+        ]
+
+    def stream_expenses_for_tax_month(
+        self,
+        period_from: date,
+        period_to: date,
+        status: str = "paid",
+    ) -> AsyncIterator[Dict[str, Any]]:
+        since, until = FakturoidClient.tax_month_window(period_from, period_to)
+        return self.stream_expenses(since=since, until=until, status=status)
+
+    async def iter_expenses_for_tax_month(
+        self,
+        period_from: date,
+        period_to: date,
+        status: str = "paid",
+    ) -> List[Dict[str, Any]]:
+        return [
+            row
+            async for row in self.stream_expenses_for_tax_month(
+                period_from, period_to, status=status
+            )
+        ]
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    On-disk cache of Fakturoid list responses for conditional requests.
+
+    One JSON file per (account, endpoint, query params incl. page) holding the
+    body plus the ETag / Last-Modified validators. Callers send the validators
+    back and reuse the stored body on `304 Not Modified`. When the directory
+    grows past `max_bytes`, least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(account: str, path: str, params: Mapping[str, Any]) -> str:
+        raw = json.dumps([account, path, sorted(params.items())], default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def validators(self, key: str) -> Dict[str, str]:
+        """Conditional request headers for a cached entry (empty if none)."""
+        entry = self._load(key)
+        if not entry:
+            return {}
+        headers: Dict[str, str] = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get(self, key: str) -> Optional[Any]:
+        """Stored body for `key`; marks the entry as recently used."""
+        entry = self._load(key)
+        if entry is None:
+            return None
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry.get("body")
+
+    def put(self, key: str, headers: Mapping[str, str], body: Any) -> None:
+        self.put_raw(key, headers, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+    def put_raw(self, key: str, headers: Mapping[str, str], body: bytes) -> None:
+        """Like `put`, with the body already JSON-encoded (the response bytes as received)."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not (etag or last_modified):
+            # nothing to revalidate with – not worth keeping
+            return
+        envelope = json.dumps(
+            {"etag": etag, "last_modified": last_modified}, ensure_ascii=False
+        ).encode("utf-8")
+        payload = envelope[:-1] + b', "body": ' + body + b"}"
+        target = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            with self._lock:
+                size = self._current_size()
+                old = target.stat().st_size if target.exists() else 0
+                os.replace(tmp, target)
+                self._size = size + len(payload) - old
+                if self._size > self.max_bytes:
+                    self._evict()
+        except BaseException:
+            # never leave an uncounted temp file behind in the cache directory
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self.directory.glob("*.json"))
+        return self._size
+
+    def _evict(self) -> None:
+        entries: List[Tuple[float, int, Path]] = []
+        for p in self.directory.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        # drop oldest until we are comfortably under the limit
+        target = int(self.max_bytes * 0.9)
+        for _, entry_size, p in entries:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
@@ -1,16 +1,183 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
-from typing import Any, Dict, List, Optional
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from config.settings import (
+    FAKTUROID_CACHE_DIR,
+    FAKTUROID_CACHE_MAX_MB,
     FAKTUROID_CLIENT_ID,
     FAKTUROID_CLIENT_SECRET,
+    FAKTUROID_MAX_RETRIES,
+    FAKTUROID_PREFETCH_PAGES,
+    FAKTUROID_RATE_LIMIT,
     FAKTUROID_SLUG,
+    FAKTUROID_TOKEN_FILE,
     FAKTUROID_USER_AGENT,
 )
+from fakturoid.cache import ResponseCache
+from fakturoid.decoding import decode_expense_page, decode_invoice_page
+from fakturoid.expense_window import expense_window_bounds, tax_month_window
+from fakturoid.token_store import StoredToken, TokenStore
+
+logger = logging.getLogger(__name__)
+
+
+def build_list_params(
+    page: int,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    status: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Query params for the paginated invoice/expense list endpoints."""
+    params: Dict[str, Any] = {"page": page}
+    if status:
+        params["status"] = status
+    if since:
+        params["since"] = since.isoformat()
+    if until:
+        params["until"] = until.isoformat()
+    if updated_since:
+        params["updated_since"] = updated_since.isoformat()
+    return params
+
+
+class RequestScheduler:
+    """
+    Paces and retries Fakturoid requests; one instance may be shared by any
+    number of clients, threads and asyncio tasks hitting the same account.
+
+    - token bucket of `rate_limit` requests per `window` seconds, corrected
+      from the `X-RateLimit-Policy` / `X-RateLimit` response headers,
+    - 429 and 5xx are retried up to `max_retries` times, honouring
+      `Retry-After`, else with full-jitter exponential backoff,
+    - `stats` counts sent, throttled (429) and retried requests.
+
+    `reserve()` / `retry_delay()` only compute how long to wait, so the sync
+    client sleeps with `time.sleep` and the async one with `asyncio.sleep`;
+    `clock` (default `time.monotonic`) is the time they measure against.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        rate_limit: int = FAKTUROID_RATE_LIMIT,
+        window: float = 60.0,
+        max_retries: int = FAKTUROID_MAX_RETRIES,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.capacity = float(rate_limit)
+        self.refill_rate = rate_limit / window
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats: Dict[str, int] = {"requests": 0, "throttled": 0, "retried": 0, "waits": 0}
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one request slot; returns seconds to wait before sending."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.refill_rate
+            )
+            self._updated = now
+            self._tokens -= 1.0
+            self.stats["requests"] += 1
+            delay = max(0.0, self._paused_until - now)
+            if self._tokens < 0:
+                delay = max(delay, -self._tokens / self.refill_rate)
+            if delay > 0:
+                self.stats["waits"] += 1
+            return delay
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        """Align the bucket with the server's view of the quota."""
+        policy = self._parse_fields(headers.get("X-RateLimit-Policy"))
+        state = self._parse_fields(headers.get("X-RateLimit"))
+        with self._lock:
+            if "q" in policy and "w" in policy and policy["w"] > 0:
+                self.capacity = policy["q"]
+                self.refill_rate = policy["q"] / policy["w"]
+            if "r" in state:
+                self._tokens = min(self._tokens, state["r"])
+                if state["r"] <= 0 and state.get("t"):
+                    self._paused_until = max(self._paused_until, self._clock() + state["t"])
+            if status == 429:
+                self.stats["throttled"] += 1
+
+    def should_retry(self, status: int, attempt: int) -> bool:
+        return status in self.RETRY_STATUSES and attempt < self.max_retries
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Delay before retry number `attempt` (0-based); counts the retry."""
+        with self._lock:
+            self.stats["retried"] += 1
+        retry_after = self._parse_retry_after((headers or {}).get("Retry-After"))
+        if retry_after is not None:
+            with self._lock:
+                self._paused_until = max(self._paused_until, self._clock() + retry_after)
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _parse_fields(value: Optional[str]) -> Dict[str, float]:
+        # e.g. "default;q=400;w=60" or "default;r=399;t=55"
+        out: Dict[str, float] = {}
+        for part in (value or "").split(";"):
+            key, sep, raw = part.strip().partition("=")
+            if not sep:
+                continue
+            try:
+                out[key] = float(raw)
+            except ValueError:
+                continue
+        return out
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
 
 
 class FakturoidClient:
@@ -29,7 +196,21 @@ class FakturoidClient:
         client_id: Optional[str] = None,
         client_secret: Optional[str] = None,
         user_agent: Optional[str] = None,
+        prefetch_pages: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        token_store: Optional[TokenStore] = None,
+        scheduler: Optional[RequestScheduler] = None,
     ) -> None:
+        """
+        `prefetch_pages` > 0 makes the page iterators keep that many pages
+        in flight on a thread pool sharing this client's session (0 = serial).
+        `cache` (default: FAKTUROID_CACHE_DIR if set) stores list responses
+        on disk and revalidates them with ETag / If-Modified-Since.
+        `token_store` (default: FAKTUROID_TOKEN_FILE if set) reuses unexpired
+        access tokens across processes.
+        `scheduler` paces/retries requests; pass one instance to several
+        clients to share a quota.
+        """
         self.slug = slug or FAKTUROID_SLUG
         self.client_id = client_id or FAKTUROID_CLIENT_ID
         self.client_secret = client_secret or FAKTUROID_CLIENT_SECRET
@@ -38,7 +219,15 @@ class FakturoidClient:
         if not (self.slug and self.client_id and self.client_secret):
             raise RuntimeError("Fakturoid OAuth2 credentials missing in environment/config")
 
+        self.prefetch_pages = max(
+            0, FAKTUROID_PREFETCH_PAGES if prefetch_pages is None else prefetch_pages
+        )
+
         self.session = requests.Session()
+        if self.prefetch_pages:
+            # one pooled connection per in-flight page
+            adapter = HTTPAdapter(pool_maxsize=max(10, self.prefetch_pages))
+            self.session.mount("https://", adapter)
         self.session.headers.update(
             {
                 "User-Agent": self.user_agent,
@@ -46,16 +235,41 @@ class FakturoidClient:
             }
         )
 
-        self._access_token: Optional[str] = None
-        self._token_type: str = "Bearer"
+        if cache is None and FAKTUROID_CACHE_DIR:
+            cache = ResponseCache(
+                FAKTUROID_CACHE_DIR, max_bytes=FAKTUROID_CACHE_MAX_MB * 1024 * 1024
+            )
+        self.cache = cache
+
+        if token_store is None and FAKTUROID_TOKEN_FILE:
+            token_store = TokenStore(FAKTUROID_TOKEN_FILE)
+        self.token_store = token_store
+
+        self.scheduler = scheduler or RequestScheduler()
+
+        self._token: Optional[StoredToken] = None
+        self._token_lock = threading.Lock()
 
     def _url(self, path: str) -> str:
         return f"{self.BASE_URL}/accounts/{self.slug}{path}"
 
-    def _ensure_token(self) -> None:
-        if self._access_token is not None:
-            return
+    def _ensure_token(self) -> StoredToken:
+        token = self._token
+        if token is not None and token.is_valid():
+            return token
+        with self._token_lock:
+            # another thread may have refreshed it while we waited
+            if self._token is not None and self._token.is_valid():
+                return self._token
+            token = self.token_store.load(self.client_id) if self.token_store else None
+            if token is None:
+                token = self._fetch_token()
+                if self.token_store is not None:
+                    self.token_store.save(self.client_id, token)
+            self._token = token
+            return token
 
+    def _fetch_token(self) -> StoredToken:
         data = {"grant_type": "client_credentials"}
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         # HTTP Basic auth with client_id:client_secret, as per docs
@@ -67,17 +281,88 @@ class FakturoidClient:
             timeout=30,
         )
         resp.raise_for_status()
-        payload = resp.json()
-        token = payload.get("access_token")
-        if not token:
-            raise RuntimeError(f"Failed to obtain Fakturoid access token: {payload!r}")
-        self._access_token = token
-        # e.g. "Bearer" – use whatever server returns
-        self._token_type = (payload.get("token_type") or "Bearer").strip()
-
-    def _auth_headers(self) -> Dict[str, str]:
-        self._ensure_token()
-        return {"Authorization": f"{self._token_type} {self._access_token}"}
+        return StoredToken.from_response(resp.json())
+
+    def _invalidate_token(self, rejected: StoredToken) -> None:
+        with self._token_lock:
+            # only drop it if nobody has replaced it already
+            if self._token is rejected:
+                self._token = None
+                if self.token_store is not None:
+                    self.token_store.invalidate(self.client_id, rejected.access_token)
+
+    def _auth_headers(self, token: Optional[StoredToken] = None) -> Dict[str, str]:
+        token = token or self._ensure_token()
+        return {"Authorization": f"{token.token_type} {token.access_token}"}
+
+    def _get(self, url: str, **kwargs: Any) -> requests.Response:
+        """GET through the scheduler, retrying 429 / 5xx and connection errors."""
+        attempt = 0
+        while True:
+            delay = self.scheduler.reserve()
+            if delay:
+                time.sleep(delay)
+            try:
+                resp = self.session.get(url, timeout=30, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                wait = self.scheduler.retry_delay(attempt)
+                logger.warning("Fakturoid request failed (%s), retrying in %.1fs", exc, wait)
+            else:
+                self.scheduler.observe(resp.status_code, resp.headers)
+                if not self.scheduler.should_retry(resp.status_code, attempt):
+                    return resp
+                wait = self.scheduler.retry_delay(attempt, resp.headers)
+                logger.warning(
+                    "Fakturoid returned %s, retrying in %.1fs", resp.status_code, wait
+                )
+            time.sleep(wait)
+            attempt += 1
+
+    def _get_list(
+        self,
+        path: str,
+        params: Dict[str, Any],
+        what: str,
+        conditional: bool = True,
+        retry_auth: bool = True,
+        decode: Optional[Callable[[bytes], Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        `decode` turns the response bytes into rows (see `fakturoid.decoding`);
+        rows served from the cache on 304 are plain dicts either way.
+        """
+        token = self._ensure_token()
+        headers = {**self.session.headers, **self._auth_headers(token)}
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self.slug, path, params)
+            if conditional:
+                headers.update(self.cache.validators(cache_key))
+        resp = self._get(self._url(path), headers=headers, params=params)
+        if resp.status_code == 401 and retry_auth:
+            # token revoked or expired early – get a new one and retry once
+            self._invalidate_token(token)
+            return self._get_list(path, params, what, conditional, retry_auth=False, decode=decode)
+        if resp.status_code == 304 and cache_key is not None:
+            data = self.cache.get(cache_key)
+            if data is None:
+                # entry evicted since we read its validators
+                return self._get_list(path, params, what, conditional=False, decode=decode)
+        else:
+            resp.raise_for_status()
+            if decode is None:
+                data = resp.json()
+                if cache_key is not None and isinstance(data, list):
+                    self.cache.put(cache_key, resp.headers, data)
+            else:
+                data = decode(resp.content)
+                if cache_key is not None and isinstance(data, list):
+                    self.cache.put_raw(cache_key, resp.headers, resp.content)
+        if not isinstance(data, list):
+            raise RuntimeError(f"Unexpected {what} response: {data!r}")
+        return data
 
     def list_invoices(
         self,
@@ -85,31 +370,46 @@ class FakturoidClient:
         until: Optional[date] = None,
         #status: str = "paid",
         page: int = 1,
+        updated_since: Optional[datetime] = None,
+        typed: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Fetch invoices with basic filtering.
         You can loop over pages while response is non-empty.
+        `typed` decodes only the fields the parsers read (see `fakturoid.decoding`).
         """
-        params: Dict[str, Any] = {"page": page}
-        #if status:
-        #    params["status"] = status
-        if since:
-            params["since"] = since.isoformat()
-        if until:
-            params["until"] = until.isoformat()
-
-        headers = {**self.session.headers, **self._auth_headers()}
-        resp = self.session.get(
-            self._url("/invoices.json"),
-            headers=headers,
-            params=params,
-            timeout=30,
+        params = build_list_params(page, since, until, updated_since=updated_since)
+        decode = decode_invoice_page if typed else None
+        return self._get_list("/invoices.json", params, "invoices", decode=decode)
+
+    def iter_invoice_pages(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        updated_since: Optional[datetime] = None,
+        typed: bool = False,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield invoice pages as they arrive; stops on the first empty page.
+        Only one page is held in memory at a time.
+        """
+        return self._paginate(
+            self.list_invoices,
+            since=since,
+            until=until,
+            updated_since=updated_since,
+            typed=typed,
         )
-        resp.raise_for_status()
-        data = resp.json()
-        if not isinstance(data, list):
-            raise RuntimeError(f"Unexpected invoices response: {data!r}")
-        return data
+
+    def stream_invoices(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        typed: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield invoices one by one, fetching the next page lazily."""
+        for chunk in self.iter_invoice_pages(since=since, until=until, typed=typed):
+            yield from chunk
 
     def iter_invoices(
         self,
@@ -119,17 +419,9 @@ class FakturoidClient:
     ) -> List[Dict[str, Any]]:
         """
         Convenience: pull all pages into one list.
-        For bigger volumes you might want a generator instead.
+        For bigger volumes use `stream_invoices` / `iter_invoice_pages`.
         """
-        page = 1
-        all_invoices: List[Dict[str, Any]] = []
-        while True:
-            chunk = self.list_invoices(since=since, until=until, page=page)
-            if not chunk:
-                break
-            all_invoices.extend(chunk)
-            page += 1
-        return all_invoices
+        return list(self.stream_invoices(since=since, until=until))
 
     def list_expenses(
         self,
@@ -137,26 +429,41 @@ class FakturoidClient:
         until: Optional[date] = None,
         status: str = "paid",
         page: int = 1,
+        updated_since: Optional[datetime] = None,
+        typed: bool = False,
     ) -> List[Dict[str, Any]]:
-        params: Dict[str, Any] = {"page": page}
-        if status:
-            params["status"] = status
-        if since:
-            params["since"] = since.isoformat()
-        if until:
-            params["until"] = until.isoformat()
-        headers = {**self.session.headers, **self._auth_headers()}
-        resp = self.session.get(
-            self._url("/expenses.json"),
-            headers=headers,
-            params=params,
-            timeout=30,
+        params = build_list_params(page, since, until, status=status, updated_since=updated_since)
+        decode = decode_expense_page if typed else None
+        return self._get_list("/expenses.json", params, "expenses", decode=decode)
+
+    def iter_expense_pages(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+        updated_since: Optional[datetime] = None,
+        typed: bool = False,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        return self._paginate(
+            self.list_expenses,
+            since=since,
+            until=until,
+            status=status,
+            updated_since=updated_since,
+            typed=typed,
         )
-        resp.raise_for_status()
-        data = resp.json()
-        if not isinstance(data, list):
-            raise RuntimeError(f"Unexpected expenses response: {data!r}")
-        return data
+
+    def stream_expenses(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        status: str = "paid",
+        typed: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        for chunk in self.iter_expense_pages(
+            since=since, until=until, status=status, typed=typed
+        ):
+            yield from chunk
 
     def iter_expenses(
         self,
@@ -164,15 +471,21 @@ class FakturoidClient:
         until: Optional[date] = None,
         status: str = "paid",
     ) -> List[Dict[str, Any]]:
-        page = 1
-        all_rows: List[Dict[str, Any]] = []
-        while True:
-            chunk = self.list_expenses(since=since, until=until, status=status, page=page)
-            if not chunk:
-                break
-            all_rows.extend(chunk)
-            page += 1
-        return all_rows
+        return list(self.stream_expenses(since=since, until=until, status=status))
+
+    @staticmethod
+    def tax_month_window(period_from: date, period_to: date) -> tuple[date, date]:
+        return tax_month_window(period_from, period_to)
+
+    def stream_expenses_for_tax_month(
+        self,
+        period_from: date,
+        period_to: date,
+        status: str = "paid",
+        typed: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        since, until = self.tax_month_window(period_from, period_to)
+        return self.stream_expenses(since=since, until=until, status=status, typed=typed)
 
     def iter_expenses_for_tax_month(
         self,
@@ -180,11 +493,63 @@ class FakturoidClient:
         period_to: date,
         status: str = "paid",
     ) -> List[Dict[str, Any]]:
+        return list(self.stream_expenses_for_tax_month(period_from, period_to, status=status))
+
+    def stream_expenses_for_tax_months(
+        self,
+        periods: Iterable[Tuple[date, date]],
+        status: str = "paid",
+        typed: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """Expenses for several tax months in one download of their joint window."""
+        since, until = expense_window_bounds(periods)
+        return self.stream_expenses(since=since, until=until, status=status, typed=typed)
+
+    def _paginate(
+        self,
+        fetch_page: Callable[..., List[Dict[str, Any]]],
+        **params: Any,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        if self.prefetch_pages:
+            yield from self._paginate_prefetch(fetch_page, self.prefetch_pages, **params)
+            return
+        page = 1
+        while True:
+            chunk = fetch_page(page=page, **params)
+            if not chunk:
+                return
+            yield chunk
+            page += 1
+
+    def _paginate_prefetch(
+        self,
+        fetch_page: Callable[..., List[Dict[str, Any]]],
+        window: int,
+        **params: Any,
+    ) -> Iterator[List[Dict[str, Any]]]:
         """
-        Widen the API window (since/until are not reliably `received_on` on the API).
-        Caller filters by received_on / tax dates.
+        Keep up to `window` pages in flight, yield them in page order and stop
+        on the first empty page. Pages speculatively requested past the end
+        are cancelled (or their empty results discarded).
         """
-        since = period_from - timedelta(days=120)
-        until = period_to + timedelta(days=45)
-        return self.iter_expenses(since=since, until=until, status=status)
-
+        # obtain the token once up front, not concurrently from every worker
+        self._ensure_token()
+        pending: Deque[Future] = deque()
+        next_page = 1
+        with ThreadPoolExecutor(
+            max_workers=window, thread_name_prefix="fakturoid-prefetch"
+        ) as pool:
+            try:
+                while len(pending) < window:
+                    pending.append(pool.submit(fetch_page, page=next_page, **params))
+                    next_page += 1
+                while pending:
+                    chunk = pending.popleft().result()
+                    if not chunk:
+                        return
+                    pending.append(pool.submit(fetch_page, page=next_page, **params))
+                    next_page += 1
+                    yield chunk
+            finally:
+                for fut in pending:
+                    fut.cancel()
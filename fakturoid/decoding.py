@@ -0,0 +1,107 @@
+"""
+Typed decoding of Fakturoid list responses.
+
+With `msgspec` installed, a page of invoices / expenses is decoded from the
+response bytes straight into small structs holding only the fields
+`InvoiceParser` / `ExpenseParser` read – the other ~80 keys of each document
+(client details, attachments, payment info, …) are skipped by the decoder
+instead of becoming throwaway dicts.
+
+The structs answer `.get(key, default)` exactly like the JSON dict would
+(absent → default, `null` → None), so the parsers take them unchanged and
+produce identical results.
+Without `msgspec`, or when a page does not match the schema, the bytes are
+decoded with `json` into plain dicts.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional
+
+try:
+    import msgspec
+except ImportError:  # optional: `pip install msgspec` (`typed` extra)
+    msgspec = None
+
+
+def _json_page(data: bytes) -> Any:
+    return json.loads(data)
+
+
+if msgspec is not None:
+    _UNSET: Any = msgspec.UNSET
+
+    class _Row(msgspec.Struct):
+        def get(self, key: str, default: Any = None) -> Any:
+            value = getattr(self, key, _UNSET)
+            return default if value is _UNSET else value
+
+    class _Subject(_Row):
+        ico: Any = _UNSET
+        name: Any = _UNSET
+
+    class _InvoiceLine(_Row):
+        name: Any = _UNSET
+        quantity: Any = _UNSET
+        unit_price: Any = _UNSET
+        vat_rate: Any = _UNSET
+        vat_amount: Any = _UNSET
+        total: Any = _UNSET
+
+    class InvoiceRow(_Row):
+        id: Any = _UNSET
+        number: Any = _UNSET
+        issued_on: Any = _UNSET
+        taxable_fulfillment_due: Any = _UNSET
+        total: Any = _UNSET
+        subtotal: Any = _UNSET
+        total_vat: Any = _UNSET
+        vat_rates_summary: Any = _UNSET
+        dic: Any = _UNSET
+        client_registration_no: Any = _UNSET
+        subject: Optional[_Subject] = _UNSET
+        lines: Optional[List[_InvoiceLine]] = _UNSET
+
+    class ExpenseRow(_Row):
+        id: Any = _UNSET
+        number: Any = _UNSET
+        original_number: Any = _UNSET
+        status: Any = _UNSET
+        issued_on: Any = _UNSET
+        taxable_fulfillment_due: Any = _UNSET
+        received_on: Any = _UNSET
+        supplier_vat_no: Any = _UNSET
+        native_total: Any = _UNSET
+        total: Any = _UNSET
+        native_subtotal: Any = _UNSET
+        subtotal: Any = _UNSET
+        native_total_vat: Any = _UNSET
+        total_vat: Any = _UNSET
+        vat_rates_summary: Any = _UNSET
+        # the parser checks `isinstance(line, dict)`, so lines stay dicts
+        lines: Any = _UNSET
+        tax_deductible: Any = _UNSET
+        proportional_vat_deduction: Any = _UNSET
+        transferred_tax_liability: Any = _UNSET
+
+    _invoice_decoder = msgspec.json.Decoder(List[InvoiceRow])
+    _expense_decoder = msgspec.json.Decoder(List[ExpenseRow])
+
+    def decode_invoice_page(data: bytes) -> Any:
+        """Invoice list page → `InvoiceRow`s (dicts if the page is unexpected)."""
+        try:
+            return _invoice_decoder.decode(data)
+        except msgspec.DecodeError:
+            return _json_page(data)
+
+    def decode_expense_page(data: bytes) -> Any:
+        """Expense list page → `ExpenseRow`s (dicts if the page is unexpected)."""
+        try:
+            return _expense_decoder.decode(data)
+        except msgspec.DecodeError:
+            return _json_page(data)
+
+else:
+    decode_invoice_page = _json_page
+    decode_expense_page = _json_page
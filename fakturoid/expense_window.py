@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Iterable, Tuple
+
+
+def tax_month_window(period_from: date, period_to: date) -> Tuple[date, date]:
+    """
+    Widen the API window (since/until are not reliably `received_on` on the API).
+    Caller filters by received_on / tax dates.
+    """
+    return period_from - timedelta(days=120), period_to + timedelta(days=45)
+
+
+def expense_window_bounds(periods: Iterable[Tuple[date, date]]) -> Tuple[date, date]:
+    """Union of the widened windows of several tax months."""
+    windows = [tax_month_window(p_from, p_to) for p_from, p_to in periods]
+    if not windows:
+        raise ValueError("No tax periods given")
+    return min(w[0] for w in windows), max(w[1] for w in windows)
+
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class StoredToken:
+    access_token: str
+    token_type: str
+    expires_at: float  # unix time; 0 = server did not say
+
+    # refresh a bit early so a token never expires mid-request
+    EXPIRY_MARGIN = 60.0
+
+    def is_valid(self, now: Optional[float] = None) -> bool:
+        if not self.expires_at:
+            return True
+        return (now or time.time()) < self.expires_at - self.EXPIRY_MARGIN
+
+    @classmethod
+    def from_response(cls, payload: Dict[str, Any]) -> "StoredToken":
+        token = payload.get("access_token")
+        if not token:
+            raise RuntimeError(f"Failed to obtain Fakturoid access token: {payload!r}")
+        expires_in = payload.get("expires_in")
+        return cls(
+            access_token=token,
+            # e.g. "Bearer" – use whatever server returns
+            token_type=(payload.get("token_type") or "Bearer").strip(),
+            expires_at=time.time() + float(expires_in) if expires_in else 0.0,
+        )
+
+
+class TokenStore:
+    """
+    File-backed OAuth token cache shared by processes of the same user.
+
+    Tokens are keyed by a hash of the client_id (the secret never touches
+    disk); the file is created with 0600 permissions inside a 0700 directory.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(client_id: str) -> str:
+        return hashlib.sha256(client_id.encode("utf-8")).hexdigest()
+
+    def _read_all(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_all(self, data: Dict[str, Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def load(self, client_id: str) -> Optional[StoredToken]:
+        entry = self._read_all().get(self._key(client_id))
+        if not entry:
+            return None
+        try:
+            token = StoredToken(**entry)
+        except TypeError:
+            return None
+        return token if token.is_valid() else None
+
+    def save(self, client_id: str, token: StoredToken) -> None:
+        with self._lock:
+            data = self._read_all()
+            data[self._key(client_id)] = asdict(token)
+            self._write_all(data)
+
+    def invalidate(self, client_id: str, access_token: Optional[str] = None) -> None:
+        """Forget the stored token (only if it is still `access_token`, when given)."""
+        with self._lock:
+            data = self._read_all()
+            key = self._key(client_id)
+            entry = data.get(key)
+            if entry is None:
+                return
+            if access_token is not None and entry.get("access_token") != access_token:
+                # another process already stored a fresh one
+                return
+            del data[key]
+            self._write_all(data)
@@ -2,13 +2,18 @@ from __future__ import annotations
 
 import argparse
 import logging
-import os
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import date, datetime
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from config.settings import (
+    FAKTUROID_MIRROR_DB,
     OUTPUT_DIR,
+    PARSE_WORKERS,
+    TAXPAYER_PROFILE,
+    XML_VALIDATE,
     EMAIL_SMTP_HOST,
     EMAIL_SMTP_PORT,
     EMAIL_SMTP_USER,
@@ -18,10 +23,27 @@ from config.settings import (
 )
 from email_sender import send_xml_files
 from fakturoid.client import FakturoidClient
+from mirror.store import LocalMirror
+from mirror.sync import sync_mirror
+from parsers.expense_index import ExpenseIndex
 from parsers.expense_parser import ExpenseParser, ParsedExpense
 from parsers.invoice_parser import InvoiceParser, ParsedInvoice
+from parsers.parallel import parse_expense_rows, parse_invoice_rows
+from xml_generators.aggregates import TaxAggregates
 from xml_generators.dph_generator import DPHGenerator
+from xml_generators.corrective import (
+    Correction,
+    diff_kh,
+    dph_changed,
+    dph_totals,
+    own_tax,
+    read_dph_totals,
+)
 from xml_generators.dhk_generator import DHKGenerator
+from xml_generators.manifest import BuildManifest, generator_settings, input_key
+from xml_generators.periods import period_tag
+from xml_generators.taxpayer import TaxpayerProfile, load_profile
+from xml_generators.validation import SCHEMA_DIR, missing_schemas, preload_schemas, validate_file
 
 logger = logging.getLogger(__name__)
 
@@ -36,37 +58,227 @@ def _month_range(year: int, month: int) -> tuple[date, date]:
     return start, end
 
 
+def _quarter_range(year: int, quarter: int) -> tuple[date, date]:
+    start, _ = _month_range(year, 3 * quarter - 2)
+    _, end = _month_range(year, 3 * quarter)
+    return start, end
+
+
+def _year_month(value: str) -> Tuple[int, int]:
+    """argparse type for `YYYY-MM`."""
+    try:
+        parsed = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+    return parsed.year, parsed.month
+
+
+def tax_periods(
+    first: Tuple[int, int],
+    last: Tuple[int, int],
+    quarterly: bool = False,
+) -> List[Tuple[date, date]]:
+    """Monthly (or calendar-quarter) periods covering `first`..`last` inclusive."""
+    if last < first:
+        raise ValueError(f"--to {last[0]}-{last[1]:02d} is before --from {first[0]}-{first[1]:02d}")
+    periods: List[Tuple[date, date]] = []
+    year, month = first
+    if quarterly:
+        quarter, last_quarter = (month - 1) // 3 + 1, (last[1] - 1) // 3 + 1
+        while (year, quarter) <= (last[0], last_quarter):
+            periods.append(_quarter_range(year, quarter))
+            year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+        return periods
+    while (year, month) <= last:
+        periods.append(_month_range(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def _parsed_invoices(
+    rows: Iterable[Dict[str, Any]],
+    parse_workers: int = 0,
+) -> Iterable[ParsedInvoice]:
+    """
+    Parse raw invoices lazily. Of the raw JSON only the invoice lines are kept
+    (behind a LineView), the generators never need them parsed. With
+    `parse_workers` > 1, large streams are parsed in worker processes.
+    """
+    if parse_workers > 1:
+        return parse_invoice_rows(rows, parse_workers)
+    parser = InvoiceParser()
+    return (parser.parse(row, lazy_lines=True) for row in rows)
+
+
+def _parsed_expenses(
+    rows: Iterable[Dict[str, Any]],
+    parse_workers: int = 0,
+) -> Iterable[ParsedExpense]:
+    if parse_workers > 1:
+        return parse_expense_rows(rows, parse_workers)
+    parser = ExpenseParser()
+    return (parser.parse(row) for row in rows)
+
+
+def _bucket_invoices(
+    invoices: Iterable[ParsedInvoice],
+    periods: List[Tuple[date, date]],
+) -> List[List[ParsedInvoice]]:
+    """
+    Split invoices into consecutive `periods` by issue date, each period
+    half-open [from, to). The one selection rule for every fetch path: the
+    API's `until` is inclusive, so a window ending at `to` also returns
+    invoices issued on the first day of the next period.
+    """
+    starts = [p[0] for p in periods]
+    buckets: List[List[ParsedInvoice]] = [[] for _ in periods]
+    for inv in invoices:
+        issued = inv.issue_date.date()
+        idx = bisect_right(starts, issued) - 1
+        if idx >= 0 and issued < periods[idx][1]:
+            buckets[idx].append(inv)
+    return buckets
+
+
 def fetch_and_parse_invoices(
     client: FakturoidClient,
     period_from: date,
     period_to: date,
+    parse_workers: int = 0,
 ) -> List[ParsedInvoice]:
-    raw = client.iter_invoices(since=period_from, until=period_to)
-    logger.info(f"Fetched {len(raw)} invoices")
-    parser = InvoiceParser()
-    return [parser.parse(inv) for inv in raw]
+    # pages are parsed as they arrive
+    raw = client.stream_invoices(since=period_from, until=period_to, typed=True)
+    (invoices,) = _bucket_invoices(_parsed_invoices(raw, parse_workers), [(period_from, period_to)])
+    logger.info(f"Fetched {len(invoices)} invoices")
+    return invoices
+
+
+def parse_expenses(
+    rows: Iterable[Dict[str, Any]],
+    period_from: date,
+    period_to: date,
+    parse_workers: int = 0,
+) -> Iterator[ParsedExpense]:
+    """Parse raw expense rows lazily, yielding only those included in the period."""
+    for exp in _parsed_expenses(rows, parse_workers):
+        reason = ExpenseParser.exclusion_reason(exp, period_from, period_to)
+        if reason:
+            _log_skipped(exp, reason)
+            continue
+        yield exp
+
+
+def split_expenses(
+    rows: Iterable[Dict[str, Any]],
+    periods: List[Tuple[date, date]],
+    parse_workers: int = 0,
+) -> List[List[ParsedExpense]]:
+    """
+    Parse raw expense rows once and split the included ones into `periods`;
+    each skipped expense is logged once, not once per period.
+    """
+    index = ExpenseIndex(_parsed_expenses(rows, parse_workers))
+    included, skipped = index.select(periods)
+    for exp, reason in skipped:
+        _log_skipped(exp, reason)
+    return included
+
+
+def _log_skipped(exp: ParsedExpense, reason: str) -> None:
+    logger.info("Skipping expense %s: %s", exp.number or exp.evidence_number, reason)
 
 
 def fetch_and_parse_expenses(
     client: FakturoidClient,
     period_from: date,
     period_to: date,
+    parse_workers: int = 0,
 ) -> List[ParsedExpense]:
-    raw = client.iter_expenses_for_tax_month(period_from, period_to)
-    ep = ExpenseParser()
-    out: List[ParsedExpense] = []
-    for row in raw:
-        exp = ep.parse(row)
-        reason = ep.exclusion_reason(exp, period_from, period_to)
-        if reason:
-            logger.info(
-                "Skipping expense %s: %s",
-                exp.number or exp.evidence_number,
-                reason,
-            )
-            continue
-        out.append(exp)
-    return out
+    raw = client.stream_expenses_for_tax_month(period_from, period_to, typed=True)
+    return list(parse_expenses(raw, period_from, period_to, parse_workers))
+
+
+def load_from_mirror(
+    mirror: LocalMirror,
+    period_from: date,
+    period_to: date,
+    parse_workers: int = 0,
+) -> tuple[List[ParsedInvoice], List[ParsedExpense]]:
+    raw_invoices = mirror.invoices_for_period(period_from, period_to)
+    (invoices,) = _bucket_invoices(
+        _parsed_invoices(raw_invoices, parse_workers), [(period_from, period_to)]
+    )
+    logger.info(f"Loaded {len(invoices)} invoices from mirror")
+    raw = mirror.expenses_for_tax_month(period_from, period_to)
+    return invoices, list(parse_expenses(raw, period_from, period_to, parse_workers))
+
+
+def load_periods_from_mirror(
+    mirror: LocalMirror,
+    periods: List[Tuple[date, date]],
+    parse_workers: int = 0,
+) -> Dict[Tuple[date, date], tuple[List[ParsedInvoice], List[ParsedExpense]]]:
+    """Like `load_from_mirror` for several periods, one query per document kind."""
+    raw_invoices = mirror.invoices_for_period(periods[0][0], periods[-1][1])
+    invoices = _bucket_invoices(_parsed_invoices(raw_invoices, parse_workers), periods)
+    logger.info(f"Loaded {sum(len(i) for i in invoices)} invoices from mirror")
+    raw = mirror.expenses_for_tax_month(periods[0][0], periods[-1][1])
+    expenses = split_expenses(raw, periods, parse_workers)
+    return {period: (invoices[i], expenses[i]) for i, period in enumerate(periods)}
+
+
+def fetch_period(
+    client: FakturoidClient,
+    period_from: date,
+    period_to: date,
+    parse_workers: int = 0,
+) -> tuple[List[ParsedInvoice], List[ParsedExpense]]:
+    """Fetch+parse invoices and expenses concurrently over the client's shared token and pool."""
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch") as pool:
+        invoices = pool.submit(
+            fetch_and_parse_invoices, client, period_from, period_to, parse_workers
+        )
+        expenses = pool.submit(
+            fetch_and_parse_expenses, client, period_from, period_to, parse_workers
+        )
+        return invoices.result(), expenses.result()
+
+
+def _fetch_invoice_buckets(
+    client: FakturoidClient,
+    periods: List[Tuple[date, date]],
+    parse_workers: int = 0,
+) -> List[List[ParsedInvoice]]:
+    raw = client.stream_invoices(since=periods[0][0], until=periods[-1][1], typed=True)
+    buckets = _bucket_invoices(_parsed_invoices(raw, parse_workers), periods)
+    logger.info(f"Fetched {sum(len(b) for b in buckets)} invoices for {len(periods)} period(s)")
+    return buckets
+
+
+def _fetch_expense_buckets(
+    client: FakturoidClient,
+    periods: List[Tuple[date, date]],
+    parse_workers: int = 0,
+) -> List[List[ParsedExpense]]:
+    raw = client.stream_expenses_for_tax_months(periods, typed=True)
+    return split_expenses(raw, periods, parse_workers)
+
+
+def fetch_periods(
+    client: FakturoidClient,
+    periods: List[Tuple[date, date]],
+    parse_workers: int = 0,
+) -> Dict[Tuple[date, date], tuple[List[ParsedInvoice], List[ParsedExpense]]]:
+    """
+    One pass over the API for a run of consecutive periods: invoices for the
+    whole range are bucketed by issue date, expenses from a single widened
+    window by tax month (`ExpenseIndex`). Both downloads run concurrently.
+    """
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch") as pool:
+        invoices_future = pool.submit(_fetch_invoice_buckets, client, periods, parse_workers)
+        expenses_future = pool.submit(_fetch_expense_buckets, client, periods, parse_workers)
+        invoices, expenses = invoices_future.result(), expenses_future.result()
+    return {period: (invoices[i], expenses[i]) for i, period in enumerate(periods)}
 
 
 def generate_xml(
@@ -74,64 +286,181 @@ def generate_xml(
     expenses: List[ParsedExpense],
     period_from: date,
     period_to: date,
+    profile: Optional[TaxpayerProfile] = None,
+    validate: bool = False,
 ) -> tuple[Path, Path]:
-    taxpayer_ico = os.getenv("TAXPAYER_ICO", "")
-    taxpayer_dic = os.getenv("TAXPAYER_DIC", "")
-    taxpayer_name = os.getenv("TAXPAYER_NAME", "")
-    if not (taxpayer_ico and taxpayer_dic and taxpayer_name):
-        raise RuntimeError("Set TAXPAYER_ICO, TAXPAYER_DIC and TAXPAYER_NAME in env/.env")
+    """
+    DPH + KH for one period; `profile` defaults to the one from
+    TAXPAYER_PROFILE / env. With `validate` both files are checked against
+    their XSD (`SchemaValidationError` on mismatch).
+    """
+    if profile is None:
+        profile = load_profile()
 
     out_dir = Path(OUTPUT_DIR)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    period_tag = period_from.strftime("%Y%m")
-
-    dph_gen = DPHGenerator(
-        taxpayer_ico=taxpayer_ico,
-        taxpayer_dic=taxpayer_dic,
-        taxpayer_name=taxpayer_name,
-        taxpayer_title=os.getenv("TAXPAYER_TITLE", ""),
-        taxpayer_first_name=os.getenv("TAXPAYER_FIRST_NAME", ""),
-        taxpayer_last_name=os.getenv("TAXPAYER_LAST_NAME", ""),
-        taxpayer_street=os.getenv("TAXPAYER_STREET", ""),
-        taxpayer_house_number=os.getenv("TAXPAYER_HOUSE_NUMBER", ""),
-        taxpayer_house_number_pop=os.getenv("TAXPAYER_HOUSE_NUMBER_POP", ""),
-        taxpayer_city=os.getenv("TAXPAYER_CITY", ""),
-        taxpayer_zip=os.getenv("TAXPAYER_ZIP", ""),
-        taxpayer_email=os.getenv("TAXPAYER_EMAIL", ""),
-        taxpayer_phone=os.getenv("TAXPAYER_PHONE", ""),
-        taxpayer_ufo=os.getenv("TAXPAYER_UFO", "451"),
-        taxpayer_pracufo=os.getenv("TAXPAYER_PRACUFO", "2002"),
-        taxpayer_okec=os.getenv("TAXPAYER_OKEC", "631000"),
-    )
-    dph_tree = dph_gen.build_tree(invoices, period_from, period_to, expenses)
-    dph_path = out_dir / f"dph_{period_tag}.xml"
-    dph_gen.save(dph_tree, str(dph_path))
-
-    dhk_gen = DHKGenerator(
-        taxpayer_ico=taxpayer_ico,
-        taxpayer_dic=taxpayer_dic,
-        taxpayer_name=taxpayer_name,
-        taxpayer_title=os.getenv("TAXPAYER_TITLE", ""),
-        taxpayer_first_name=os.getenv("TAXPAYER_FIRST_NAME", ""),
-        taxpayer_last_name=os.getenv("TAXPAYER_LAST_NAME", ""),
-        taxpayer_street=os.getenv("TAXPAYER_STREET", ""),
-        taxpayer_house_number=os.getenv("TAXPAYER_HOUSE_NUMBER", ""),
-        taxpayer_house_number_pop=os.getenv("TAXPAYER_HOUSE_NUMBER_POP", ""),
-        taxpayer_city=os.getenv("TAXPAYER_CITY", ""),
-        taxpayer_zip=os.getenv("TAXPAYER_ZIP", ""),
-        taxpayer_email=os.getenv("TAXPAYER_EMAIL", ""),
-        taxpayer_phone=os.getenv("TAXPAYER_PHONE", ""),
-        taxpayer_ufo=os.getenv("TAXPAYER_UFO", "451"),
-        taxpayer_pracufo=os.getenv("TAXPAYER_PRACUFO", "2002"),
-    )
-    dhk_tree = dhk_gen.build_tree(invoices, period_from, period_to, expenses)
-    dhk_path = out_dir / f"dhk_{period_tag}.xml"
-    dhk_gen.save(dhk_tree, str(dhk_path))
+    tag = period_tag(period_from, period_to)
+
+    dph_gen = DPHGenerator.from_profile(profile)
+    dph_path = out_dir / f"dph_{tag}.xml"
+
+    dhk_gen = DHKGenerator.from_profile(profile)
+    dhk_path = out_dir / f"dhk_{tag}.xml"
+
+    # one pass over the documents for both forms; DPH and KH only read the
+    # aggregates, so they can be built side by side
+    aggregates = TaxAggregates.compute(invoices, expenses)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="xml") as pool:
+        futures = [
+            pool.submit(_build_and_save, gen, aggregates, period_from, period_to, path)
+            for gen, path in ((dph_gen, dph_path), (dhk_gen, dhk_path))
+        ]
+        for future in futures:
+            future.result()
+
+    if validate:
+        for path in (dph_path, dhk_path):
+            validate_file(str(path))
 
     return dph_path, dhk_path
 
 
+def _build_and_save(
+    gen: DPHGenerator | DHKGenerator,
+    aggregates: TaxAggregates,
+    period_from: date,
+    period_to: date,
+    path: Path,
+) -> None:
+    gen.write_file(str(path), aggregates.invoices, period_from, period_to, aggregates=aggregates)
+
+
+def _generate_period(
+    job: Tuple[List[ParsedInvoice], List[ParsedExpense], date, date, TaxpayerProfile, bool],
+) -> tuple[Path, Path]:
+    # top-level so it can run in a worker process
+    return generate_xml(*job)
+
+
+def generate_periods(
+    data: Dict[Tuple[date, date], tuple[List[ParsedInvoice], List[ParsedExpense]]],
+    workers: Optional[int] = None,
+    profile: Optional[TaxpayerProfile] = None,
+    validate: bool = False,
+    force: bool = False,
+) -> List[Path]:
+    """
+    Build DPH + KH for every period whose inputs changed since the last run
+    (see `BuildManifest`; `force` rebuilds all), in parallel worker processes
+    when there are several. Returns the current files of all periods.
+    """
+    # loaded once here and shipped to the workers with each job
+    profile = profile or load_profile()
+    manifest = BuildManifest.load(Path(OUTPUT_DIR))
+    settings = generator_settings(profile)
+    keys = {period: input_key(inv, exp, settings) for period, (inv, exp) in data.items()}
+    dirty = [
+        period
+        for period in sorted(data)
+        if force or not manifest.is_current(period_tag(*period), keys[period], validate)
+    ]
+    logger.info(
+        "Period(s) to generate: %s; unchanged: %s",
+        ", ".join(period_tag(*p) for p in dirty) or "none",
+        ", ".join(period_tag(*p) for p in sorted(data) if p not in dirty) or "none",
+    )
+
+    jobs = [(*data[period], *period, profile, validate) for period in dirty]
+    if validate and jobs:
+        # compiled once here (forked workers inherit them) and at most once per worker
+        preload_schemas()
+    if len(jobs) <= 1 or workers == 1:
+        results = [_generate_period(job) for job in jobs]
+    else:
+        initializer = preload_schemas if validate else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+            results = list(pool.map(_generate_period, jobs))
+    built = dict(zip(dirty, results))
+    for period, files in built.items():
+        manifest.record(period_tag(*period), keys[period], files, validated=validate)
+    if built:
+        manifest.save()
+
+    paths: List[Path] = []
+    for period in sorted(data):
+        if period in built:
+            dph_path, dhk_path = built[period]
+            logger.info(f"{period[0]:%Y-%m}: DPH XML {dph_path}, DHK XML {dhk_path}")
+        else:
+            dph_path, dhk_path = manifest.paths(period_tag(*period))
+            logger.info(f"{period[0]:%Y-%m}: unchanged, kept {dph_path} and {dhk_path}")
+        paths += [dph_path, dhk_path]
+    return paths
+
+
+def generate_corrective(
+    invoices: List[ParsedInvoice],
+    expenses: List[ParsedExpense],
+    period_from: date,
+    period_to: date,
+    previous_kh: str,
+    previous_dph: str,
+    profile: Optional[TaxpayerProfile] = None,
+    found_on: Optional[date] = None,
+) -> List[Path]:
+    """
+    Následné KH / dodatečné DPH for one period whose documents no longer
+    match the filed forms `previous_kh` / `previous_dph`. Those must be the
+    files actually submitted – regular runs overwrite `dhk_<tag>.xml` /
+    `dph_<tag>.xml`, so they are no baseline. Written to OUTPUT_DIR as
+    `dhk_<tag>_N.xml` / `dph_<tag>_D.xml`.
+    """
+    profile = profile or load_profile()
+    found_on = found_on or date.today()
+    out_dir = Path(OUTPUT_DIR)
+    tag = period_tag(period_from, period_to)
+    for label, filed_path in (("KH", previous_kh), ("DPH", previous_dph)):
+        if not Path(filed_path).is_file():
+            raise RuntimeError(f"{tag}: filed {label} {filed_path} not found")
+    dph_gen = DPHGenerator.from_profile(profile)
+    dhk_gen = DHKGenerator.from_profile(profile)
+    aggregates = TaxAggregates.compute(invoices, expenses)
+    paths: List[Path] = []
+
+    diff = diff_kh(previous_kh, dhk_gen, aggregates, period_from, period_to)
+    logger.info("%s: KH against %s: %s", tag, previous_kh, diff.summary())
+    if diff.has_changes:
+        path = out_dir / f"dhk_{tag}_N.xml"
+        dhk_gen.write_file(
+            str(path),
+            aggregates.invoices,
+            period_from,
+            period_to,
+            aggregates=aggregates,
+            correction=Correction(found_on),
+        )
+        logger.info("%s: následné KH %s", tag, path)
+        paths.append(path)
+
+    filed = read_dph_totals(previous_dph)
+    if dph_changed(filed, dph_totals(dph_gen, aggregates, period_from, period_to)):
+        path = out_dir / f"dph_{tag}_D.xml"
+        dph_gen.write_file(
+            str(path),
+            aggregates.invoices,
+            period_from,
+            period_to,
+            aggregates=aggregates,
+            correction=Correction(found_on, previous_tax=own_tax(filed)),
+        )
+        logger.info("%s: dodatečné DPH %s", tag, path)
+        paths.append(path)
+    else:
+        logger.info("%s: DPH unchanged against %s", tag, previous_dph)
+    return paths
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate tax XML files")
     parser.add_argument(
@@ -146,38 +475,196 @@ def main() -> None:
         default=None,
         help="Month 1-12 (default: last calendar month)",
     )
+    parser.add_argument(
+        "--from",
+        dest="period_first",
+        type=_year_month,
+        default=None,
+        metavar="YYYY-MM",
+        help="First month of a range of periods (use with --to)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="period_last",
+        type=_year_month,
+        default=None,
+        metavar="YYYY-MM",
+        help="Last month of a range of periods (default: same as --from)",
+    )
+    parser.add_argument(
+        "--quarterly",
+        action="store_true",
+        help="Generate calendar-quarter periods instead of months",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for XML generation (default: CPU count)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help="Worker processes for parsing large downloads, 0 = in-process "
+        "(default: PARSE_WORKERS; small batches stay in-process)",
+    )
+    parser.add_argument(
+        "--mirror",
+        default=FAKTUROID_MIRROR_DB or None,
+        metavar="PATH",
+        help="Read documents from a local SQLite mirror synced from Fakturoid "
+        "(default: FAKTUROID_MIRROR_DB)",
+    )
+    parser.add_argument(
+        "--no-sync",
+        action="store_true",
+        help="With --mirror: use the mirror as is, without contacting Fakturoid",
+    )
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="With --mirror: re-download everything and drop deleted documents",
+    )
+    parser.add_argument(
+        "--profile",
+        default=TAXPAYER_PROFILE,
+        metavar="PATH",
+        help="Taxpayer profile file with the TAXPAYER_* keys "
+        "(default: TAXPAYER_PROFILE, else env/.env)",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        default=XML_VALIDATE,
+        help="Check the generated files against the EPO XSDs before anything "
+        "is sent (default: XML_VALIDATE)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate every period, even those unchanged since the last run",
+    )
+    parser.add_argument(
+        "--corrective",
+        action="store_true",
+        help="Compare with the filed KH / DPH and write a následné KH / dodatečné DPH "
+        "for periods that changed, instead of regular forms",
+    )
+    parser.add_argument(
+        "--found-on",
+        type=date.fromisoformat,
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="With --corrective: date the reasons were found (d_zjist, default: today)",
+    )
+    parser.add_argument(
+        "--previous-kh",
+        default=None,
+        metavar="PATH",
+        help="With --corrective (required): the KH as filed – not OUTPUT_DIR/dhk_<period>.xml, "
+        "which regular runs overwrite",
+    )
+    parser.add_argument(
+        "--previous-dph",
+        default=None,
+        metavar="PATH",
+        help="With --corrective (required): the DPH as filed",
+    )
     parser.add_argument(
         "--send-email",
         action="store_true",
         help="Send generated XML files via email",
     )
     args = parser.parse_args()
+    if args.period_last is not None:
+        if args.period_first is None:
+            parser.error("--to needs --from")
+        if args.period_last < args.period_first:
+            parser.error(
+                f"--to {args.period_last[0]}-{args.period_last[1]:02d} is before "
+                f"--from {args.period_first[0]}-{args.period_first[1]:02d}"
+            )
+    # fail on a missing / incomplete profile before downloading anything
+    profile = load_profile(args.profile)
+    if args.validate:
+        missing = missing_schemas()
+        if missing:
+            parser.error(
+                f"--validate needs the EPO schemas, not found: {', '.join(missing)} "
+                f"(download them from the EPO portal into {SCHEMA_DIR} or set XSD_DIR)"
+            )
+        preload_schemas()
 
     now = datetime.now()
-    if args.month is not None:
-        month = args.month
-        year = args.year if args.year is not None else now.year
+    if args.period_first is not None:
+        first = args.period_first
+        last = args.period_last or first
+    elif args.month is not None:
+        first = last = (args.year if args.year is not None else now.year, args.month)
     else:
         # Default: last calendar month
         month = now.month - 1 or 12
         year = now.year if now.month > 1 else now.year - 1
+        first = last = (year, month)
 
-    period_from, period_to = _month_range(year, month)
-    logger.info(f"Processing tax period: {period_from} to {period_to}")
-
-    client = FakturoidClient()
-    invoices = fetch_and_parse_invoices(client, period_from, period_to)
-
-    expenses = fetch_and_parse_expenses(client, period_from, period_to)
+    periods = tax_periods(first, last, quarterly=args.quarterly)
+    if args.corrective:
+        if not (args.previous_kh and args.previous_dph):
+            parser.error("--corrective needs the filed forms: --previous-kh and --previous-dph")
+        if len(periods) > 1:
+            parser.error("--corrective works on a single period")
     logger.info(
-        "Included %s paid expense(s) for %s (month from issue date → DUZP → received)",
-        len(expenses),
-        period_from.strftime("%Y-%m"),
+        "Processing tax period(s): %s",
+        ", ".join(f"{p_from} to {p_to}" for p_from, p_to in periods),
     )
 
-    dph_path, dhk_path = generate_xml(invoices, expenses, period_from, period_to)
-    logger.info(f"DPH XML: {dph_path}")
-    logger.info(f"DHK XML: {dhk_path}")
+    data: Dict[Tuple[date, date], tuple[List[ParsedInvoice], List[ParsedExpense]]] = {}
+    if args.mirror:
+        with LocalMirror(args.mirror) as mirror:
+            if not args.no_sync:
+                sync_mirror(FakturoidClient(), mirror, full=args.full_sync)
+            if len(periods) == 1:
+                data[periods[0]] = load_from_mirror(mirror, *periods[0], args.parse_workers)
+            else:
+                data = load_periods_from_mirror(mirror, periods, args.parse_workers)
+    else:
+        client = FakturoidClient()
+        if len(periods) == 1:
+            data[periods[0]] = fetch_period(client, *periods[0], args.parse_workers)
+        else:
+            data = fetch_periods(client, periods, args.parse_workers)
+        logger.info("Fakturoid request stats: %s", client.scheduler.stats)
+    for (period_from, _), (_, expenses) in sorted(data.items()):
+        logger.info(
+            "Included %s paid expense(s) for %s (month from issue date → DUZP → received)",
+            len(expenses),
+            period_from.strftime("%Y-%m"),
+        )
+
+    if args.corrective:
+        (period_from, period_to), (invoices, expenses) = next(iter(data.items()))
+        paths = generate_corrective(
+            invoices,
+            expenses,
+            period_from,
+            period_to,
+            previous_kh=args.previous_kh,
+            previous_dph=args.previous_dph,
+            profile=profile,
+            found_on=args.found_on,
+        )
+        if args.validate:
+            for path in paths:
+                validate_file(str(path))
+    else:
+        paths = generate_periods(
+            data,
+            workers=args.workers,
+            profile=profile,
+            validate=args.validate,
+            force=args.force,
+        )
 
     if args.send_email:
         if not EMAIL_RECIPIENT:
@@ -186,7 +673,7 @@ def main() -> None:
             logger.error("EMAIL_SMTP_HOST not configured, cannot send email")
         else:
             success = send_xml_files(
-                files=[dph_path, dhk_path],
+                files=paths,
                 recipient=EMAIL_RECIPIENT,
                 smtp_host=EMAIL_SMTP_HOST,
                 smtp_port=EMAIL_SMTP_PORT,
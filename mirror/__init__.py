@@ -0,0 +1,6 @@
+
+
+
+
+
+
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    updated_at TEXT,
+    issued_on TEXT,
+    taxable_fulfillment_due TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_invoices_issued_on ON invoices(issued_on);
+CREATE INDEX IF NOT EXISTS ix_invoices_tfd ON invoices(taxable_fulfillment_due);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    updated_at TEXT,
+    issued_on TEXT,
+    taxable_fulfillment_due TEXT,
+    received_on TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_expenses_issued_on ON expenses(issued_on);
+CREATE INDEX IF NOT EXISTS ix_expenses_tfd ON expenses(taxable_fulfillment_due);
+CREATE INDEX IF NOT EXISTS ix_expenses_received_on ON expenses(received_on);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT PRIMARY KEY,
+    updated_since TEXT
+);
+"""
+
+KINDS = ("invoices", "expenses")
+
+
+def _day(value: Any) -> Optional[str]:
+    """`YYYY-MM-DD` part of a Fakturoid date/timestamp (sortable as text)."""
+    if not value:
+        return None
+    return str(value)[:10]
+
+
+class LocalMirror:
+    """
+    SQLite copy of raw Fakturoid invoices and expenses.
+
+    Documents are stored as their original JSON next to a few indexed date
+    columns, so a tax month can be selected with an index range scan and fed
+    to the usual parsers. Filled by `mirror.sync.sync_mirror`.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "LocalMirror":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def get_cursor(self, kind: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT updated_since FROM sync_state WHERE kind = ?", (kind,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, kind: str, updated_since: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state(kind, updated_since) VALUES (?, ?)",
+            (kind, updated_since),
+        )
+
+    def upsert_invoices(self, rows: Iterable[Dict[str, Any]]) -> int:
+        params = [
+            (
+                int(r["id"]),
+                r.get("updated_at"),
+                _day(r.get("issued_on")),
+                _day(r.get("taxable_fulfillment_due")),
+                r.get("status"),
+                json.dumps(r, ensure_ascii=False),
+            )
+            for r in rows
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO invoices"
+            "(id, updated_at, issued_on, taxable_fulfillment_due, status, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            params,
+        )
+        return len(params)
+
+    def upsert_expenses(self, rows: Iterable[Dict[str, Any]]) -> int:
+        params = [
+            (
+                int(r["id"]),
+                r.get("updated_at"),
+                _day(r.get("issued_on")),
+                _day(r.get("taxable_fulfillment_due")),
+                _day(r.get("received_on")),
+                r.get("status"),
+                json.dumps(r, ensure_ascii=False),
+            )
+            for r in rows
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO expenses"
+            "(id, updated_at, issued_on, taxable_fulfillment_due, received_on, status, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            params,
+        )
+        return len(params)
+
+    def delete_missing(self, kind: str, keep_ids: Iterable[int]) -> int:
+        """Drop documents not in `keep_ids` (used after a full resync)."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown document kind: {kind!r}")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _keep (id INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM _keep")
+        self.conn.executemany("INSERT OR IGNORE INTO _keep(id) VALUES (?)", ((i,) for i in keep_ids))
+        cur = self.conn.execute(f"DELETE FROM {kind} WHERE id NOT IN (SELECT id FROM _keep)")
+        return cur.rowcount
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def invoices_for_period(self, period_from: date, period_to: date) -> Iterator[Dict[str, Any]]:
+        """Invoices issued in [period_from, period_to)."""
+        cur = self.conn.execute(
+            "SELECT data FROM invoices WHERE issued_on >= ? AND issued_on < ? "
+            "ORDER BY issued_on, id",
+            (period_from.isoformat(), period_to.isoformat()),
+        )
+        for (data,) in cur:
+            yield json.loads(data)
+
+    def expenses_for_tax_month(
+        self,
+        period_from: date,
+        period_to: date,
+        status: str = "paid",
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Expenses whose canonical tax date (issued_on → DUZP → received_on,
+        see `ExpenseParser.canonical_tax_period_date`) falls in
+        [period_from, period_to). Each branch of the OR is an index range scan.
+        """
+        lo, hi = period_from.isoformat(), period_to.isoformat()
+        sql = (
+            "SELECT data FROM expenses WHERE ("
+            " (issued_on >= :lo AND issued_on < :hi)"
+            " OR (issued_on IS NULL AND taxable_fulfillment_due >= :lo"
+            "     AND taxable_fulfillment_due < :hi)"
+            " OR (issued_on IS NULL AND taxable_fulfillment_due IS NULL"
+            "     AND received_on >= :lo AND received_on < :hi)"
+            ")"
+        )
+        args: Dict[str, Any] = {"lo": lo, "hi": hi}
+        if status:
+            sql += " AND status = :status"
+            args["status"] = status
+        sql += " ORDER BY id"
+        for (data,) in self.conn.execute(sql, args):
+            yield json.loads(data)
+
+    def count(self, kind: str) -> int:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown document kind: {kind!r}")
+        return self.conn.execute(f"SELECT COUNT(*) FROM {kind}").fetchone()[0]
+
+    @staticmethod
+    def parse_updated_at(value: Any) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from fakturoid.client import FakturoidClient
+from mirror.store import LocalMirror
+
+logger = logging.getLogger(__name__)
+
+
+def sync_mirror(
+    client: FakturoidClient,
+    mirror: LocalMirror,
+    full: bool = False,
+) -> Dict[str, int]:
+    """
+    Pull invoices and expenses changed since the last sync into the mirror.
+
+    The first sync (or `full=True`) downloads everything; later ones pass the
+    newest `updated_at` seen as `updated_since`. Expenses are synced in every
+    status so that a change away from `paid` is reflected locally. The API
+    does not report deletions – a full sync removes documents that no longer
+    exist in Fakturoid.
+    """
+    counts: Dict[str, int] = {}
+    counts["invoices"] = _sync_kind(
+        mirror,
+        "invoices",
+        lambda updated_since: client.iter_invoice_pages(updated_since=updated_since),
+        mirror.upsert_invoices,
+        full,
+    )
+    counts["expenses"] = _sync_kind(
+        mirror,
+        "expenses",
+        lambda updated_since: client.iter_expense_pages(status="", updated_since=updated_since),
+        mirror.upsert_expenses,
+        full,
+    )
+    return counts
+
+
+def _sync_kind(
+    mirror: LocalMirror,
+    kind: str,
+    fetch_pages: Callable[[Optional[datetime]], Iterator[List[Dict[str, Any]]]],
+    upsert: Callable[[List[Dict[str, Any]]], int],
+    full: bool,
+) -> int:
+    cursor = None if full else LocalMirror.parse_updated_at(mirror.get_cursor(kind))
+    newest = cursor
+    seen: Set[int] = set()
+    total = 0
+    for page in fetch_pages(cursor):
+        total += upsert(page)
+        for row in page:
+            if full:
+                seen.add(int(row["id"]))
+            ts = LocalMirror.parse_updated_at(row.get("updated_at"))
+            if ts is not None and (newest is None or ts > newest):
+                newest = ts
+    if full:
+        removed = mirror.delete_missing(kind, seen)
+        if removed:
+            logger.info("Removed %s %s no longer present in Fakturoid", removed, kind)
+    if newest is not None:
+        mirror.set_cursor(kind, newest.isoformat())
+    # cursor only moves forward once the whole batch is stored
+    mirror.commit()
+    logger.info(
+        "Mirror sync %s: %s document(s) %s",
+        kind,
+        total,
+        "(full)" if cursor is None else f"updated since {cursor.isoformat()}",
+    )
+    return total
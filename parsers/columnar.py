@@ -0,0 +1,197 @@
+"""
+Columnar (NumPy-backed) views of parsed invoices and expenses.
+
+Built once from the parsed models (`from_parsed`, a Python loop per
+document), after which period masks, DPH totals and the KH split are array
+reductions – `TaxAggregates.from_tables` aggregates over them. Amounts are
+int64 haléř columns, summed exactly like the models' `*_haler` fields;
+dates are int32 days since 1970-01-01 (`NO_DATE` when missing) and DIČ is
+categorical (int32 codes into `dic_categories`, -1 = none).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from parsers.expense_parser import ExpenseParser, ParsedExpense
+from parsers.invoice_parser import ParsedInvoice
+
+NO_DATE = np.iinfo(np.int32).min
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_number(value: Optional[date | datetime]) -> int:
+    if value is None or value == datetime.min:
+        return NO_DATE
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+class _Categories:
+    """Builds int codes for repeated strings (DIČ)."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: Optional[str]) -> int:
+        if not value:
+            return -1
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+@dataclass
+class InvoiceTable:
+    number: List[str]
+    issue_day: np.ndarray
+    taxable_day: np.ndarray
+    total_haler: np.ndarray
+    vat_base_haler: np.ndarray
+    vat_amount_haler: np.ndarray
+    vat_rate: np.ndarray
+    customer_dic: np.ndarray
+    dic_categories: List[str]
+
+    def __len__(self) -> int:
+        return len(self.number)
+
+    @classmethod
+    def from_parsed(cls, invoices: Iterable[ParsedInvoice]) -> "InvoiceTable":
+        cats = _Categories()
+        number: List[str] = []
+        cols: Tuple[List[Any], ...] = ([], [], [], [], [], [], [])
+        issue, taxable, total, base, vat, rate, dic = cols
+        for inv in invoices:
+            number.append(inv.invoice_number)
+            issue.append(day_number(inv.issue_date))
+            taxable.append(day_number(inv.taxable_supply_date))
+            total.append(inv.total_haler)
+            base.append(inv.vat_base_haler)
+            vat.append(inv.vat_amount_haler)
+            rate.append(inv.vat_rate)
+            dic.append(cats.code(inv.customer_dic))
+        return cls(
+            number=number,
+            issue_day=np.array(issue, dtype=np.int32),
+            taxable_day=np.array(taxable, dtype=np.int32),
+            total_haler=np.array(total, dtype=np.int64),
+            vat_base_haler=np.array(base, dtype=np.int64),
+            vat_amount_haler=np.array(vat, dtype=np.int64),
+            vat_rate=np.array(rate, dtype=np.float64),
+            customer_dic=np.array(dic, dtype=np.int32),
+            dic_categories=cats.values,
+        )
+
+    def issued_between(self, period_from: date, period_to: date) -> np.ndarray:
+        """Boolean mask of invoices issued in [period_from, period_to)."""
+        lo, hi = day_number(period_from), day_number(period_to)
+        return (self.issue_day >= lo) & (self.issue_day < hi)
+
+    def totals(self, mask: Optional[np.ndarray] = None) -> Tuple[int, int]:
+        """(sum of vat_base, sum of vat_amount) in haléře – DPH ř. 1 obrat / daň."""
+        base, vat = self.vat_base_haler, self.vat_amount_haler
+        if mask is not None:
+            base, vat = base[mask], vat[mask]
+        return int(base.sum()), int(vat.sum())
+
+
+@dataclass
+class ExpenseTable:
+    number: List[str]
+    evidence_number: List[str]
+    tax_day: np.ndarray
+    total_with_vat_haler: np.ndarray
+    base_21_haler: np.ndarray
+    vat_21_haler: np.ndarray
+    base_12_haler: np.ndarray
+    vat_12_haler: np.ndarray
+    eligible: np.ndarray
+    supplier_dic: np.ndarray
+    dic_categories: List[str]
+
+    def __len__(self) -> int:
+        return len(self.number)
+
+    @classmethod
+    def from_parsed(cls, expenses: Iterable[ParsedExpense]) -> "ExpenseTable":
+        cats = _Categories()
+        number: List[str] = []
+        evidence: List[str] = []
+        cols: Tuple[List[Any], ...] = ([], [], [], [], [], [], [], [])
+        tax_day, total, b21, v21, b12, v12, eligible, dic = cols
+        for exp in expenses:
+            number.append(exp.number)
+            evidence.append(exp.evidence_number)
+            tax_day.append(day_number(ExpenseParser.canonical_tax_period_date(exp)))
+            total.append(exp.total_with_vat_haler)
+            b21.append(exp.base_21_haler)
+            v21.append(exp.vat_21_haler)
+            b12.append(exp.base_12_haler)
+            v12.append(exp.vat_12_haler)
+            eligible.append(ExpenseParser.is_eligible_for_odpocet(exp))
+            dic.append(cats.code(exp.supplier_dic))
+        return cls(
+            number=number,
+            evidence_number=evidence,
+            tax_day=np.array(tax_day, dtype=np.int32),
+            total_with_vat_haler=np.array(total, dtype=np.int64),
+            base_21_haler=np.array(b21, dtype=np.int64),
+            vat_21_haler=np.array(v21, dtype=np.int64),
+            base_12_haler=np.array(b12, dtype=np.int64),
+            vat_12_haler=np.array(v12, dtype=np.int64),
+            eligible=np.array(eligible, dtype=bool),
+            supplier_dic=np.array(dic, dtype=np.int32),
+            dic_categories=cats.values,
+        )
+
+    def included(self, period_from: date, period_to: date) -> np.ndarray:
+        """Mask of expenses `ExpenseParser.exclusion_reason` would include."""
+        lo, hi = day_number(period_from), day_number(period_to)
+        return self.eligible & (self.tax_day >= lo) & (self.tax_day < hi)
+
+    def dph_totals(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Input-VAT bases/VAT per rate in haléře (DPH ř. 40 / 41)."""
+        cols = {
+            "base_21": self.base_21_haler,
+            "vat_21": self.vat_21_haler,
+            "base_12": self.base_12_haler,
+            "vat_12": self.vat_12_haler,
+        }
+        return {k: int((v if mask is None else v[mask]).sum()) for k, v in cols.items()}
+
+    def kh_split(
+        self,
+        threshold_haler: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        KH section masks: `b2` rows (over threshold, with DIČ and some VAT),
+        `b3` (at or under threshold, aggregated), `missing_dic` (over
+        threshold without DIČ – omitted from KH) and `no_vat` (over threshold
+        with DIČ but no parsed VAT – omitted from B2).
+        """
+        base = np.ones(len(self), dtype=bool) if mask is None else mask
+        total = self.total_with_vat_haler
+        big = base & (total > threshold_haler)
+        has_dic = self.supplier_dic >= 0
+        has_vat = (
+            (self.base_21_haler != 0)
+            | (self.vat_21_haler != 0)
+            | (self.base_12_haler != 0)
+            | (self.vat_12_haler != 0)
+        )
+        return {
+            "b2": big & has_dic & has_vat,
+            "b3": base & (total <= threshold_haler),
+            "missing_dic": big & ~has_dic,
+            "no_vat": big & has_dic & ~has_vat,
+        }
@@ -0,0 +1,136 @@
+"""
+Compact, immutable variants of the parsed models for multi-year histories.
+
+`CompactInvoice` / `CompactExpense` are NamedTuples: no per-instance
+`__dict__`, picklable, and accepted anywhere the generators take
+`ParsedInvoice` / `ParsedExpense` (they only read attributes). Measured on
+CPython 3.11 (`sys.getsizeof`, excluding the shared field values):
+
+    ParsedInvoice   56 B object + 288 B __dict__  ≈ 344 B
+                    (+ a list and ~310 B per ParsedLine)
+    CompactInvoice  160 B (+ 40 B LineView over the raw line dicts)
+    ParsedExpense   56 B object + 288 B __dict__  ≈ 344 B
+    CompactExpense  200 B
+
+`LineView` (see `parsers.invoice_parser`) keeps invoice lines as the raw
+Fakturoid dicts and builds a `ParsedLine` only when an item is accessed
+(the generators never do).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+from parsers.expense_parser import ExpenseParser, ParsedExpense
+from parsers.invoice_parser import InvoiceParser, LineView, ParsedInvoice, ParsedLine
+
+
+class CompactInvoice(NamedTuple):
+    invoice_number: str
+    issue_date: datetime
+    taxable_supply_date: Optional[datetime]
+    total: float
+    vat_base: float
+    vat_amount: float
+    vat_rate: float
+    customer_ico: Optional[str]
+    customer_dic: Optional[str]
+    customer_name: Optional[str]
+    taxpayer_dic: Optional[str]
+    total_haler: int
+    vat_base_haler: int
+    vat_amount_haler: int
+    lines: Sequence[ParsedLine] = ()
+
+    @classmethod
+    def from_parsed(
+        cls,
+        inv: ParsedInvoice,
+        lines: Optional[Sequence[ParsedLine]] = None,
+    ) -> "CompactInvoice":
+        if lines is None:
+            # a LineView is already immutable and lazy – share it, don't build ParsedLines
+            lines = inv.lines if isinstance(inv.lines, LineView) else tuple(inv.lines)
+        return cls(
+            invoice_number=inv.invoice_number,
+            issue_date=inv.issue_date,
+            taxable_supply_date=inv.taxable_supply_date,
+            total=inv.total,
+            vat_base=inv.vat_base,
+            vat_amount=inv.vat_amount,
+            vat_rate=inv.vat_rate,
+            customer_ico=inv.customer_ico,
+            customer_dic=inv.customer_dic,
+            customer_name=inv.customer_name,
+            taxpayer_dic=inv.taxpayer_dic,
+            lines=lines,
+            total_haler=inv.total_haler,
+            vat_base_haler=inv.vat_base_haler,
+            vat_amount_haler=inv.vat_amount_haler,
+        )
+
+    @classmethod
+    def from_raw(cls, invoice: Dict[str, Any]) -> "CompactInvoice":
+        """Parse raw JSON; lines stay raw behind a `LineView`."""
+        return cls.from_parsed(InvoiceParser.parse(invoice, lazy_lines=True))
+
+
+class CompactExpense(NamedTuple):
+    number: str
+    evidence_number: str
+    supplier_dic: Optional[str]
+    total_with_vat: float
+    taxable_supply_date: Optional[datetime]
+    received_on: Optional[datetime]
+    issued_on: Optional[datetime]
+    base_21: float
+    vat_21: float
+    base_12: float
+    vat_12: float
+    tax_deductible: bool
+    proportional_vat_deduction: int
+    transferred_tax_liability: bool
+    status: str
+    total_with_vat_haler: int
+    base_21_haler: int
+    vat_21_haler: int
+    base_12_haler: int
+    vat_12_haler: int
+
+    def dppd_for_kh(self) -> datetime:
+        return (
+            self.taxable_supply_date
+            or self.issued_on
+            or self.received_on
+            or datetime.min
+        )
+
+    @classmethod
+    def from_parsed(cls, exp: ParsedExpense) -> "CompactExpense":
+        return cls(
+            number=exp.number,
+            evidence_number=exp.evidence_number,
+            supplier_dic=exp.supplier_dic,
+            total_with_vat=exp.total_with_vat,
+            taxable_supply_date=exp.taxable_supply_date,
+            received_on=exp.received_on,
+            issued_on=exp.issued_on,
+            base_21=exp.base_21,
+            vat_21=exp.vat_21,
+            base_12=exp.base_12,
+            vat_12=exp.vat_12,
+            tax_deductible=exp.tax_deductible,
+            proportional_vat_deduction=exp.proportional_vat_deduction,
+            transferred_tax_liability=exp.transferred_tax_liability,
+            status=exp.status,
+            total_with_vat_haler=exp.total_with_vat_haler,
+            base_21_haler=exp.base_21_haler,
+            vat_21_haler=exp.vat_21_haler,
+            base_12_haler=exp.base_12_haler,
+            vat_12_haler=exp.vat_12_haler,
+        )
+
+    @classmethod
+    def from_raw(cls, expense: Dict[str, Any]) -> "CompactExpense":
+        return cls.from_parsed(ExpenseParser.parse(expense))
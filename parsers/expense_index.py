@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from datetime import date
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from parsers.expense_parser import MISSING_DATE_REASON, ExpenseParser, ParsedExpense
+
+# (position in input, canonical tax date, expense, ineligibility reason or None)
+_Entry = Tuple[int, date, ParsedExpense, Optional[str]]
+
+
+class ExpenseIndex:
+    """
+    Parsed expenses bucketed by the (year, month) of their canonical tax date.
+
+    Every expense is parsed, dated and checked for eligibility once, when the
+    index is built; a period is then the union of its month buckets, so any
+    number of periods is served from one scan of the rows. Within a period
+    expenses keep their input (API) order.
+    """
+
+    def __init__(self, expenses: Iterable[ParsedExpense]) -> None:
+        self._months: Dict[Tuple[int, int], List[_Entry]] = {}
+        self.undated: List[ParsedExpense] = []
+        for order, exp in enumerate(expenses):
+            d = ExpenseParser.canonical_tax_period_date(exp)
+            if d is None:
+                self.undated.append(exp)
+                continue
+            entry = (order, d, exp, ExpenseParser.ineligibility_reason(exp))
+            self._months.setdefault((d.year, d.month), []).append(entry)
+
+    @classmethod
+    def from_raw(cls, rows: Iterable[Dict[str, Any]]) -> "ExpenseIndex":
+        """Parse raw Fakturoid JSON (or typed rows) while indexing; rows may be a stream."""
+        parser = ExpenseParser()
+        return cls(parser.parse(row) for row in rows)
+
+    def __len__(self) -> int:
+        return sum(len(b) for b in self._months.values()) + len(self.undated)
+
+    def _entries(self, period_from: date, period_to: date) -> List[_Entry]:
+        picked: List[_Entry] = []
+        year, month = period_from.year, period_from.month
+        while date(year, month, 1) < period_to:
+            for entry in self._months.get((year, month), ()):
+                if period_from <= entry[1] < period_to:
+                    picked.append(entry)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        picked.sort(key=itemgetter(0))
+        return picked
+
+    def for_period(self, period_from: date, period_to: date) -> List[ParsedExpense]:
+        """Expenses `ExpenseParser.exclusion_reason` would include in [period_from, period_to)."""
+        return [e[2] for e in self._entries(period_from, period_to) if e[3] is None]
+
+    def select(
+        self,
+        periods: List[Tuple[date, date]],
+    ) -> Tuple[List[List[ParsedExpense]], List[Tuple[ParsedExpense, str]]]:
+        """
+        Included expenses for each of `periods`, plus every skipped expense
+        exactly once with its reason (the reason `exclusion_reason` gives for
+        the period it falls in, or for the whole span when it falls in none).
+        """
+        included: List[List[ParsedExpense]] = []
+        skipped: List[Tuple[ParsedExpense, str]] = []
+        placed: Set[int] = set()
+        for period_from, period_to in periods:
+            bucket: List[ParsedExpense] = []
+            for order, _, exp, reason in self._entries(period_from, period_to):
+                placed.add(order)
+                if reason is None:
+                    bucket.append(exp)
+                else:
+                    skipped.append((exp, reason))
+            included.append(bucket)
+        if periods:
+            span_from = min(p[0] for p in periods)
+            span_to = max(p[1] for p in periods)
+            for key in sorted(self._months):
+                for order, d, exp, _ in self._months[key]:
+                    if order not in placed:
+                        skipped.append((exp, ExpenseParser.outside_reason(d, span_from, span_to)))
+        skipped += [(exp, MISSING_DATE_REASON) for exp in self.undated]
+        return included, skipped
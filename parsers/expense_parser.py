@@ -4,6 +4,12 @@ from dataclasses import dataclass
 from datetime import date, datetime
 from typing import Any, Dict, List, Optional
 
+from parsers.dates import parse_date
+from parsers.invoice_parser import dominant_rate
+from xml_generators.czk import to_haler
+
+MISSING_DATE_REASON = "missing issued_on, taxable_fulfillment_due, and received_on"
+
 
 @dataclass
 class ParsedExpense:
@@ -24,6 +30,12 @@ class ParsedExpense:
     proportional_vat_deduction: int
     transferred_tax_liability: bool
     status: str
+    # the amounts above in integer haléře (required: the generators sum these)
+    total_with_vat_haler: int
+    base_21_haler: int
+    vat_21_haler: int
+    base_12_haler: int
+    vat_12_haler: int
 
     def dppd_for_kh(self) -> datetime:
         return (
@@ -53,6 +65,7 @@ class ExpenseParser:
 
         base_21 = base_12 = 0.0
         vat_21 = vat_12 = 0.0
+        base_21_h = vat_21_h = base_12_h = vat_12_h = 0
 
         summary = expense.get("vat_rates_summary")
         if isinstance(summary, list):
@@ -65,9 +78,13 @@ class ExpenseParser:
                 if rate >= 20:
                     base_21 += b
                     vat_21 += v
+                    base_21_h += to_haler(b)
+                    vat_21_h += to_haler(v)
                 elif rate >= 10:
                     base_12 += b
                     vat_12 += v
+                    base_12_h += to_haler(b)
+                    vat_12_h += to_haler(v)
         else:
             sub = float(expense.get("native_subtotal") or expense.get("subtotal") or 0)
             tvat = float(
@@ -76,16 +93,20 @@ class ExpenseParser:
                 or 0
             )
             lines = expense.get("lines") or []
-            rates = [
-                float((ln or {}).get("vat_rate") or 0)
-                for ln in lines
-                if isinstance(ln, dict)
-            ]
-            dominant = max(set(rates), key=rates.count) if rates else 21.0
+            dominant = dominant_rate(
+                (
+                    float((ln or {}).get("vat_rate") or 0)
+                    for ln in lines
+                    if isinstance(ln, dict)
+                ),
+                default=21.0,
+            )
             if dominant >= 20:
                 base_21, vat_21 = sub, tvat
+                base_21_h, vat_21_h = to_haler(sub), to_haler(tvat)
             elif dominant >= 10:
                 base_12, vat_12 = sub, tvat
+                base_12_h, vat_12_h = to_haler(sub), to_haler(tvat)
 
         return ParsedExpense(
             number=str(expense.get("number") or expense.get("id") or ""),
@@ -103,6 +124,11 @@ class ExpenseParser:
             proportional_vat_deduction=int(expense.get("proportional_vat_deduction") or 100),
             transferred_tax_liability=bool(expense.get("transferred_tax_liability", False)),
             status=str(expense.get("status") or ""),
+            total_with_vat_haler=to_haler(total),
+            base_21_haler=base_21_h,
+            vat_21_haler=vat_21_h,
+            base_12_haler=base_12_h,
+            vat_12_haler=vat_12_h,
         )
 
     @staticmethod
@@ -110,14 +136,8 @@ class ExpenseParser:
         s = dic.replace("CZ", "").replace("cz", "").replace(" ", "").strip()
         return "".join(c for c in s if c.isdigit())
 
-    @staticmethod
-    def _parse_date(value: Optional[str]) -> Optional[datetime]:
-        if not value:
-            return None
-        try:
-            return datetime.fromisoformat(value)
-        except ValueError:
-            return datetime.fromisoformat(value.split("T")[0])
+    # shared, memoized (see parsers.dates)
+    _parse_date = staticmethod(parse_date)
 
     @staticmethod
     def is_eligible_for_odpocet(exp: ParsedExpense) -> bool:
@@ -150,28 +170,37 @@ class ExpenseParser:
             return False
         return period_from <= d < period_to
 
+    @staticmethod
+    def outside_reason(d: date, period_from: date, period_to: date) -> str:
+        return (
+            f"assigned to {d.isoformat()} (issue → DUZP → received), "
+            f"outside {period_from.isoformat()}..{period_to.isoformat()}"
+        )
+
+    @staticmethod
+    def ineligibility_reason(exp: ParsedExpense) -> Optional[str]:
+        """Why the expense can never be claimed (any period); None if eligible."""
+        if ExpenseParser.is_eligible_for_odpocet(exp):
+            return None
+        parts: List[str] = []
+        if exp.status and exp.status != "paid":
+            parts.append(f"status={exp.status!r} (need paid)")
+        if not exp.tax_deductible:
+            parts.append("tax_deductible=false")
+        if exp.transferred_tax_liability:
+            parts.append("reverse charge")
+        if exp.proportional_vat_deduction != 100:
+            parts.append(f"proportional_vat_deduction={exp.proportional_vat_deduction}%")
+        return "; ".join(parts) or "not eligible for odpočet"
+
     @staticmethod
     def exclusion_reason(
         exp: ParsedExpense, period_from: date, period_to: date
     ) -> Optional[str]:
         """Human-readable reason when an expense is not included; None if it would be included."""
-        if not ExpenseParser.in_tax_period(exp, period_from, period_to):
-            d = ExpenseParser.canonical_tax_period_date(exp)
-            if d is None:
-                return "missing issued_on, taxable_fulfillment_due, and received_on"
-            return (
-                f"assigned to {d.isoformat()} (issue → DUZP → received), "
-                f"outside {period_from.isoformat()}..{period_to.isoformat()}"
-            )
-        if not ExpenseParser.is_eligible_for_odpocet(exp):
-            parts: List[str] = []
-            if exp.status and exp.status != "paid":
-                parts.append(f"status={exp.status!r} (need paid)")
-            if not exp.tax_deductible:
-                parts.append("tax_deductible=false")
-            if exp.transferred_tax_liability:
-                parts.append("reverse charge")
-            if exp.proportional_vat_deduction != 100:
-                parts.append(f"proportional_vat_deduction={exp.proportional_vat_deduction}%")
-            return "; ".join(parts) or "not eligible for odpočet"
-        return None
+        d = ExpenseParser.canonical_tax_period_date(exp)
+        if d is None:
+            return MISSING_DATE_REASON
+        if not period_from <= d < period_to:
+            return ExpenseParser.outside_reason(d, period_from, period_to)
+        return ExpenseParser.ineligibility_reason(exp)
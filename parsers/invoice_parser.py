@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+from collections import Counter
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, overload
+
+from parsers.dates import parse_date
+from xml_generators.czk import to_haler
 
 
 @dataclass
@@ -28,14 +32,86 @@ class ParsedInvoice:
     customer_dic: Optional[str]
     customer_name: Optional[str]
     taxpayer_dic: Optional[str]
-    lines: List[ParsedLine]
+    lines: Sequence[ParsedLine]
+    # the amounts above in integer haléře (required: the generators sum these)
+    total_haler: int
+    vat_base_haler: int
+    vat_amount_haler: int
+
+
+def dominant_rate(rates: Iterable[float], default: float = 0.0) -> float:
+    """
+    Most common VAT rate in one pass (same tie-break as the former
+    `max(set(rates), key=rates.count)`, which was quadratic).
+    """
+    counts = Counter(rates)
+    if not counts:
+        return default
+    return max(set(counts), key=counts.__getitem__)
+
+
+# the raw line keys `InvoiceParser._parse_line` reads
+LINE_KEYS = ("name", "quantity", "unit_price", "vat_rate", "vat_amount", "total")
+
+
+class LineView(Sequence[ParsedLine]):
+    """Read-only sequence of `ParsedLine`, materialized per access from raw line rows."""
+
+    __slots__ = ("_raw",)
+
+    def __init__(self, raw_lines: Optional[List[Dict[str, Any]]]) -> None:
+        self._raw = raw_lines or []
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    @overload
+    def __getitem__(self, index: int) -> ParsedLine: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[ParsedLine]: ...
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [InvoiceParser._parse_line(ln) for ln in self._raw[index]]
+        return InvoiceParser._parse_line(self._raw[index])
+
+    def __iter__(self) -> Iterator[ParsedLine]:
+        for ln in self._raw:
+            yield InvoiceParser._parse_line(ln)
+
+    def __repr__(self) -> str:
+        return f"LineView({len(self._raw)} lines)"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LineView):
+            return self._raw == other._raw
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __reduce__(self) -> Any:
+        return (LineView, (self._raw,))
+
+    def compact(self) -> "LineView":
+        """The same lines with raw dicts cut down to `LINE_KEYS` (small to pickle)."""
+        return LineView(
+            [
+                {k: ln[k] for k in LINE_KEYS if k in ln} if isinstance(ln, dict) else ln
+                for ln in self._raw
+            ]
+        )
 
 
 class InvoiceParser:
     """Translate raw Fakturoid invoice JSON to a simpler VAT-centric structure."""
 
     @staticmethod
-    def parse(invoice: Dict[str, Any]) -> ParsedInvoice:
+    def parse(invoice: Dict[str, Any], lazy_lines: bool = False) -> ParsedInvoice:
+        """
+        With `lazy_lines`, lines stay raw behind a `LineView` and the dominant
+        VAT rate is read straight from the raw dicts.
+        """
         issued_on = InvoiceParser._parse_date(invoice.get("issued_on"))
         taxable_supply_date = InvoiceParser._parse_date(
             invoice.get("taxable_fulfillment_due")
@@ -43,7 +119,13 @@ class InvoiceParser:
         )
 
         lines_raw: List[Dict[str, Any]] = invoice.get("lines", []) or []
-        lines = [InvoiceParser._parse_line(l) for l in lines_raw]
+        lines: Sequence[ParsedLine]
+        if lazy_lines:
+            lines = LineView(lines_raw)
+            vat_rate = InvoiceParser._raw_vat_rate(lines_raw)
+        else:
+            lines = [InvoiceParser._parse_line(l) for l in lines_raw]
+            vat_rate = InvoiceParser._extract_vat_rate(lines)
 
         # Extract taxpayer DIC from invoice (dic field is the taxpayer's DIC)
         taxpayer_dic = invoice.get("dic")
@@ -52,39 +134,41 @@ class InvoiceParser:
         vat_rates_summary = invoice.get("vat_rates_summary")
         if isinstance(vat_rates_summary, list):
             # Sum up VAT from all entries in the list
-            vat_amount = sum(float(entry.get("vat", 0) or 0) for entry in vat_rates_summary if isinstance(entry, dict))
+            vats = [float(entry.get("vat", 0) or 0) for entry in vat_rates_summary if isinstance(entry, dict)]
+            vat_amount = sum(vats)
+            vat_amount_haler = sum(to_haler(v) for v in vats)
         elif isinstance(vat_rates_summary, dict):
             vat_amount = float(vat_rates_summary.get("vat", 0) or 0)
+            vat_amount_haler = to_haler(vat_amount)
         else:
             # Fallback to total_vat if vat_rates_summary is not available
             vat_amount = float(invoice.get("total_vat", 0) or 0)
+            vat_amount_haler = to_haler(vat_amount)
+
+        total = float(invoice.get("total", 0) or 0)
+        vat_base = float(invoice.get("subtotal", 0) or 0)
 
         return ParsedInvoice(
             invoice_number=str(invoice.get("number") or invoice.get("id")),
             issue_date=issued_on or datetime.min,
             taxable_supply_date=taxable_supply_date,
-            total=float(invoice.get("total", 0) or 0),
-            vat_base=float(invoice.get("subtotal", 0) or 0),
+            total=total,
+            vat_base=vat_base,
             vat_amount=vat_amount,
-            vat_rate=InvoiceParser._extract_vat_rate(lines),
+            vat_rate=vat_rate,
             customer_ico=(invoice.get("subject") or {}).get("ico"),
             customer_dic=invoice.get("client_registration_no"),
             customer_name=(invoice.get("subject") or {}).get("name"),
 
             taxpayer_dic=taxpayer_dic,
             lines=lines,
+            total_haler=to_haler(total),
+            vat_base_haler=to_haler(vat_base),
+            vat_amount_haler=vat_amount_haler,
         )
 
-    @staticmethod
-    def _parse_date(value: Optional[str]) -> Optional[datetime]:
-        if not value:
-            return None
-        # Fakturoid dates are ISO, usually `YYYY-MM-DD`
-        try:
-            return datetime.fromisoformat(value)
-        except ValueError:
-            # be tolerant to timestamps etc.
-            return datetime.fromisoformat(value.split("T")[0])
+    # shared, memoized (see parsers.dates)
+    _parse_date = staticmethod(parse_date)
 
     @staticmethod
     def _parse_line(line: Dict[str, Any]) -> ParsedLine:
@@ -98,14 +182,15 @@ class InvoiceParser:
         )
 
     @staticmethod
-    def _extract_vat_rate(lines: List[ParsedLine]) -> float:
-        if not lines:
-            return 0.0
-        rates = [l.vat_rate for l in lines if l.vat_rate]
-        if not rates:
-            return 0.0
-        # most common rate
-        return max(set(rates), key=rates.count)
+    def _extract_vat_rate(lines: Sequence[ParsedLine]) -> float:
+        # most common non-zero rate
+        return dominant_rate(l.vat_rate for l in lines if l.vat_rate)
+
+    @staticmethod
+    def _raw_vat_rate(lines_raw: List[Dict[str, Any]]) -> float:
+        """`_extract_vat_rate` over raw line dicts, without building `ParsedLine`s."""
+        rates = (float(l.get("vat_rate", 0) or 0) for l in lines_raw)
+        return dominant_rate(r for r in rates if r)
 
 
 
@@ -0,0 +1,92 @@
+"""
+Opt-in parsing of large document streams in worker processes.
+
+Rows are cut into chunks, each chunk is parsed in a `ProcessPoolExecutor`
+into the compact NamedTuple models (`parsers.compact`) – small to pickle
+back, invoice lines cut down to the keys `ParsedLine` reads – and results
+are yielded in input order. A stream shorter than `min_rows` never starts
+a pool: it is parsed in-process into the same compact models, as pool
+startup would cost more than it saves.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, TypeVar
+
+from config.settings import PARSE_PARALLEL_MIN_ROWS
+from parsers.compact import CompactExpense, CompactInvoice
+
+T = TypeVar("T")
+
+CHUNK_ROWS = 2000
+
+
+def _parse_invoice_chunk(rows: List[Dict[str, Any]]) -> List[CompactInvoice]:
+    invoices = map(CompactInvoice.from_raw, rows)
+    # only the line keys `ParsedLine` is built from are pickled back
+    return [inv._replace(lines=inv.lines.compact()) for inv in invoices]
+
+
+def _parse_expense_chunk(rows: List[Dict[str, Any]]) -> List[CompactExpense]:
+    return [CompactExpense.from_raw(row) for row in rows]
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_rows(
+    rows: Iterable[Dict[str, Any]],
+    parse_chunk: Callable[[List[Dict[str, Any]]], List[T]],
+    workers: int,
+    min_rows: int,
+    chunk_rows: int,
+) -> Iterator[T]:
+    it = iter(rows)
+    head = list(islice(it, min_rows))
+    if workers <= 1 or len(head) < min_rows:
+        yield from parse_chunk(head)
+        for chunk in _chunks(it, chunk_rows):
+            yield from parse_chunk(chunk)
+        return
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for chunk in _chunks(chain(head, it), chunk_rows):
+                pending.append(pool.submit(parse_chunk, chunk))
+                # keep every worker busy without buffering the whole stream
+                if len(pending) > 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+
+def parse_invoice_rows(
+    rows: Iterable[Dict[str, Any]],
+    workers: int,
+    min_rows: int = PARSE_PARALLEL_MIN_ROWS,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[CompactInvoice]:
+    """Raw invoices (dicts or typed rows) → `CompactInvoice`s, in order."""
+    return _parse_rows(rows, _parse_invoice_chunk, workers, min_rows, chunk_rows)
+
+
+def parse_expense_rows(
+    rows: Iterable[Dict[str, Any]],
+    workers: int,
+    min_rows: int = PARSE_PARALLEL_MIN_ROWS,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[CompactExpense]:
+    """Raw expenses (dicts or typed rows) → `CompactExpense`s, in order."""
+    return _parse_rows(rows, _parse_expense_chunk, workers, min_rows, chunk_rows)
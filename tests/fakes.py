@@ -0,0 +1,63 @@
+"""A stand-in for the Fakturoid HTTP API, for client tests."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from fakturoid.client import FakturoidClient, RequestScheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.content = json.dumps(body).encode() if body is not None else b""
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+class FakeSession:
+    """
+    `requests.Session` look-alike: `handler(url, headers, params)` answers
+    each GET; token POSTs hand out `t1`, `t2`, … valid for `expires_in`.
+    """
+
+    def __init__(self, handler: Callable[[str, Dict[str, str], Dict[str, Any]], FakeResponse], expires_in: int = 7200) -> None:
+        self.handler = handler
+        self.expires_in = expires_in
+        self.headers: Dict[str, str] = {}
+        self.gets: List[Dict[str, Any]] = []
+        self.tokens_issued = 0
+
+    def get(self, url: str, timeout: Any = None, headers: Any = None, params: Any = None) -> FakeResponse:
+        request = {"url": url, "headers": dict(headers or {}), "params": dict(params or {})}
+        self.gets.append(request)
+        return self.handler(url, request["headers"], request["params"])
+
+    def post(self, url: str, **kwargs: Any) -> FakeResponse:
+        self.tokens_issued += 1
+        return FakeResponse(
+            body={"access_token": f"t{self.tokens_issued}", "token_type": "Bearer", "expires_in": self.expires_in}
+        )
+
+
+def make_client(handler, **kwargs: Any) -> FakturoidClient:
+    """Client on a `FakeSession`; no cache / token file unless passed."""
+    kwargs.setdefault("scheduler", RequestScheduler(rate_limit=10**6, max_retries=2))
+    cache = kwargs.pop("cache", None)
+    token_store = kwargs.pop("token_store", None)
+    expires_in = kwargs.pop("expires_in", 7200)
+    client = FakturoidClient(slug="acme", client_id="id", client_secret="secret", **kwargs)
+    # explicit, whatever FAKTUROID_CACHE_DIR / FAKTUROID_TOKEN_FILE say
+    client.cache = cache
+    client.token_store = token_store
+    client.session = FakeSession(handler, expires_in=expires_in)
+    return client
@@ -0,0 +1,65 @@
+"""Per-period totals shared by DPH and KH."""
+
+from __future__ import annotations
+
+from parsers.expense_parser import ExpenseParser
+from parsers.invoice_parser import InvoiceParser
+from xml_generators.aggregates import KH_ROW_THRESHOLD_HALER, TaxAggregates
+
+
+def _invoice(number: int, base: str, vat: str) -> dict:
+    return {
+        "id": number,
+        "number": f"2024-{number:04d}",
+        "issued_on": "2024-03-05",
+        "subtotal": base,
+        "total_vat": vat,
+        "vat_rates_summary": [{"vat_rate": 21, "base": base, "vat": vat}],
+        "dic": "CZ12345678",
+    }
+
+
+def _expense(number: int, rate: int, base: str, vat: str, total: str, supplier: str = "CZ11223344") -> dict:
+    return {
+        "id": number,
+        "number": f"N{number}",
+        "issued_on": "2024-03-05",
+        "supplier_vat_no": supplier,
+        "native_total": total,
+        "vat_rates_summary": [{"vat_rate": rate, "native_base": base, "native_vat": vat}],
+        "status": "paid",
+    }
+
+
+def test_output_vat_is_summed_exactly():
+    # 0.1 + 0.2 + ... drifts in floats; haléře do not
+    invoices = [InvoiceParser.parse(_invoice(i, "0.10", "0.02")) for i in range(1, 1001)]
+    agg = TaxAggregates.compute(invoices)
+    assert agg.out_base == 10000
+    assert agg.out_vat == 2000
+    assert agg.taxpayer_dic == "12345678"
+    assert agg.invoices == invoices
+
+
+def test_expenses_split_by_rate_and_kh_threshold():
+    expenses = [
+        ExpenseParser.parse(e)
+        for e in (
+            # at the threshold: B3
+            _expense(1, 21, "8264.46", "1735.54", "10000.00"),
+            # over the threshold with DIČ: B2
+            _expense(2, 12, "20000.00", "2400.00", "22400.00"),
+            # over the threshold without DIČ: DPH only
+            _expense(3, 21, "10000.00", "2100.00", "12100.00", supplier=""),
+        )
+    ]
+    agg = TaxAggregates.compute([], expenses)
+
+    assert (agg.in_base_21, agg.in_vat_21) == (1826446, 383554)
+    assert (agg.in_base_12, agg.in_vat_12) == (2000000, 240000)
+
+    assert expenses[0].total_with_vat_haler == KH_ROW_THRESHOLD_HALER
+    assert (agg.b3_count, agg.b3_base_21, agg.b3_vat_21) == (1, 826446, 173554)
+    assert [e.number for e in agg.kh_rows] == ["N2"]
+    assert (agg.b2_base_21, agg.b2_base_12) == (0, 2000000)
+    assert (agg.kh_pln23, agg.kh_pln5) == (826446, 2000000)
@@ -0,0 +1,85 @@
+"""Conditional requests through the on-disk ResponseCache."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from fakturoid.cache import ResponseCache
+from tests.fakes import FakeResponse, make_client
+
+ROWS = [{"id": 1, "number": "2024-0001"}]
+
+
+def _etag_api(etag: str = '"v1"'):
+    def handler(url, headers, params):
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(304, headers={"ETag": etag})
+        return FakeResponse(200, ROWS, headers={"ETag": etag})
+
+    return handler
+
+
+@pytest.mark.parametrize("typed", [False, True])
+def test_not_modified_reuses_the_stored_page(tmp_path, typed):
+    client = make_client(_etag_api(), cache=ResponseCache(tmp_path))
+    # typed pages are structs answering .get like the JSON dicts
+    assert [row.get("number") for row in client.list_invoices(typed=typed)] == ["2024-0001"]
+    assert "If-None-Match" not in client.session.gets[0]["headers"]
+
+    assert client.list_invoices(typed=typed) == ROWS
+    assert client.session.gets[1]["headers"]["If-None-Match"] == '"v1"'
+
+
+def test_changed_page_replaces_the_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    make_client(_etag_api('"v1"'), cache=cache).list_invoices()
+    client = make_client(_etag_api('"v2"'), cache=cache)
+    client.list_invoices()
+    key = cache.key("acme", "/invoices.json", {"page": 1})
+    assert cache.validators(key) == {"If-None-Match": '"v2"'}
+
+
+def test_entry_evicted_after_the_validators_were_read(tmp_path):
+    cache = ResponseCache(tmp_path)
+    client = make_client(_etag_api(), cache=cache)
+    client.list_invoices()
+    get = cache.get
+    # gone between validators() and get(): the 304 cannot be served
+    cache.get = lambda key: (os.unlink(cache._path(key)), get(key))[1]
+    assert client.list_invoices() == ROWS
+    assert "If-None-Match" not in client.session.gets[-1]["headers"]
+
+
+def test_responses_without_validators_are_not_stored(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("k", {}, ROWS)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path)
+    for key in "abc":
+        cache.put(key, {"ETag": key}, ROWS)
+    size = cache._path("a").stat().st_size
+    for when, key in enumerate("abc", start=1):
+        os.utime(cache._path(key), (when * 1000, when * 1000))
+    assert cache.get("a") == ROWS  # now the most recently used
+
+    cache = ResponseCache(tmp_path, max_bytes=int(3.5 * size))
+    cache.put("d", {"ETag": "d"}, ROWS)
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["a", "c", "d"]
+    assert cache._current_size() == 3 * size
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path)
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError, match="disk full"):
+        cache.put("k", {"ETag": "x"}, ROWS)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,61 @@
+"""Columnar (NumPy) aggregation gives the same totals as the Python loop."""
+
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from parsers.columnar import ExpenseTable, InvoiceTable  # noqa: E402
+from parsers.expense_parser import ExpenseParser  # noqa: E402
+from parsers.invoice_parser import InvoiceParser  # noqa: E402
+from tests.test_aggregates import _expense, _invoice  # noqa: E402
+from xml_generators.aggregates import TaxAggregates  # noqa: E402
+
+
+def _documents():
+    invoices = [InvoiceParser.parse(_invoice(i, f"{i}.10", f"{i * 0.21:.2f}")) for i in range(1, 301)]
+    expenses = []
+    for i in range(1, 301):
+        base = 100.0 * i + 0.05
+        rate = 21 if i % 3 else 12
+        vat = round(base * rate / 100, 2)
+        supplier = "" if i % 7 == 0 else "CZ11223344"
+        expenses.append(
+            ExpenseParser.parse(
+                _expense(i, rate, f"{base:.2f}", f"{vat:.2f}", f"{base + vat:.2f}", supplier=supplier)
+            )
+        )
+    return invoices, expenses
+
+
+def test_tables_hold_haler_as_int64():
+    invoices, expenses = _documents()
+    inv = InvoiceTable.from_parsed(invoices)
+    exp = ExpenseTable.from_parsed(expenses)
+    assert inv.vat_base_haler.dtype == np.int64
+    assert exp.total_with_vat_haler.dtype == np.int64
+    assert inv.totals() == (
+        sum(i.vat_base_haler for i in invoices),
+        sum(i.vat_amount_haler for i in invoices),
+    )
+
+
+def test_from_tables_matches_compute():
+    invoices, expenses = _documents()
+    loop = TaxAggregates.compute(invoices, expenses)
+    columnar = TaxAggregates.from_tables(invoices, expenses)
+    prebuilt = TaxAggregates.from_tables(
+        invoices,
+        expenses,
+        InvoiceTable.from_parsed(invoices),
+        ExpenseTable.from_parsed(expenses),
+    )
+
+    assert columnar.kh_rows and columnar.b3_count
+    assert dataclasses.asdict(columnar) == dataclasses.asdict(loop)
+    assert dataclasses.asdict(prebuilt) == dataclasses.asdict(loop)
+    for name in ("out_base", "in_vat_21", "b2_base_12", "b3_vat_21"):
+        assert type(getattr(columnar, name)) is int
@@ -0,0 +1,41 @@
+"""Compact models keep invoice lines lazy."""
+
+from __future__ import annotations
+
+import pickle
+
+from parsers.compact import CompactInvoice
+from parsers.invoice_parser import InvoiceParser, LineView, ParsedLine
+from parsers.parallel import _parse_invoice_chunk
+
+RAW = {
+    "id": 7,
+    "number": "2024-0007",
+    "issued_on": "2024-03-05",
+    "subtotal": "100.00",
+    "total": "121.00",
+    "lines": [
+        {"name": "Work", "quantity": "2", "unit_price": "50", "vat_rate": 21, "total": "121.00", "unit_name": "h"},
+    ],
+}
+
+
+def test_from_parsed_shares_the_line_view():
+    inv = InvoiceParser.parse(RAW, lazy_lines=True)
+    compact = CompactInvoice.from_parsed(inv)
+    assert compact.lines is inv.lines
+    assert CompactInvoice.from_raw(RAW).lines == inv.lines
+
+
+def test_from_parsed_freezes_parsed_lines():
+    inv = InvoiceParser.parse(RAW)
+    compact = CompactInvoice.from_parsed(inv)
+    assert compact.lines == tuple(inv.lines)
+    assert isinstance(compact.lines[0], ParsedLine)
+    assert list(LineView(RAW["lines"])) == list(compact.lines)
+
+
+def test_worker_chunks_pickle_only_the_line_keys():
+    (inv,) = _parse_invoice_chunk([RAW])
+    assert "unit_name" not in pickle.dumps(inv).decode("latin-1")
+    assert list(inv.lines) == list(InvoiceParser.parse(RAW).lines)
@@ -0,0 +1,138 @@
+"""Následné KH / dodatečné DPH: diffing against filed forms."""
+
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from lxml import etree
+
+from parsers.expense_parser import ExpenseParser
+from parsers.invoice_parser import InvoiceParser
+from tests.test_aggregates import _expense, _invoice
+from xml_generators.aggregates import TaxAggregates
+from xml_generators.corrective import (
+    Correction,
+    KhIndex,
+    diff_kh,
+    dph_changed,
+    dph_totals,
+    own_tax,
+    read_dph_totals,
+)
+from xml_generators.dhk_generator import DHKGenerator
+from xml_generators.dph_generator import DPHGenerator
+from xml_generators.taxpayer import TaxpayerProfile
+
+PROFILE = TaxpayerProfile(ico="12345678", dic="CZ12345678", name="Jan Novák")
+MARCH = (date(2024, 3, 1), date(2024, 4, 1))
+
+
+def _a4(row: int, evid: str, dic: str = "87654321", base: str = "1000") -> etree._Element:
+    return etree.Element("VetaA4", c_radku=str(row), c_evid_dd=evid, dic_odb=dic, zakl_dane1=base)
+
+
+def _rows(*elements: etree._Element):
+    return [(el.tag, dict(el.attrib)) for el in elements]
+
+
+def _agg(vat: str = "210.00", invoices: int = 3) -> TaxAggregates:
+    return TaxAggregates.compute(
+        [InvoiceParser.parse(_invoice(i, "1000.00", vat)) for i in range(1, invoices + 1)],
+        [
+            ExpenseParser.parse(_expense(1, 21, "500.00", "105.00", "605.00")),
+            ExpenseParser.parse(_expense(2, 12, "20000.00", "2400.00", "22400.00")),
+        ],
+    )
+
+
+def test_diff_reports_added_removed_and_changed_rows():
+    index = KhIndex(_rows(_a4(1, "F1"), _a4(2, "F2"), _a4(3, "F3")))
+    # F1 moved to another row number only; F2 changed; F3 gone; F4 new
+    diff = index.diff([_a4(5, "F1"), _a4(1, "F2", base="1200"), _a4(2, "F4")])
+
+    assert diff.unchanged == 1
+    assert [(old["c_evid_dd"], new["zakl_dane1"]) for old, new in diff.changed] == [("F2", "1200")]
+    assert [row["c_evid_dd"] for row in diff.removed] == ["F3"]
+    assert [row["c_evid_dd"] for row in diff.added] == ["F4"]
+    assert diff.has_changes
+    assert diff.summary() == "1 added, 1 changed, 1 removed, 1 unchanged"
+
+
+def test_diff_matches_duplicate_keys_as_a_multiset():
+    # the same document number twice for one customer
+    index = KhIndex(_rows(_a4(1, "F1"), _a4(2, "F1"), _a4(3, "F1", base="500")))
+    assert index.size == 3
+
+    same = index.diff([_a4(1, "F1", base="500"), _a4(2, "F1"), _a4(3, "F1")])
+    assert not same.has_changes and same.unchanged == 3
+
+    diff = index.diff([_a4(1, "F1"), _a4(2, "F1", base="700")])
+    assert diff.unchanged == 1
+    assert len(diff.changed) == 1 and not diff.added
+    assert len(diff.removed) == 1
+
+
+def test_diff_keys_rows_by_counterparty():
+    index = KhIndex(_rows(_a4(1, "F1", dic="11111111")))
+    diff = index.diff([_a4(1, "F1", dic="22222222")])
+    assert len(diff.added) == 1 and len(diff.removed) == 1 and not diff.changed
+
+
+def test_diff_kh_against_a_filed_file(tmp_path):
+    gen = DHKGenerator.from_profile(PROFILE)
+    filed = tmp_path / "dhk_202403.xml"
+    gen.write_file(str(filed), [], *MARCH, aggregates=_agg())
+
+    assert not diff_kh(str(filed), gen, _agg(), *MARCH).has_changes
+    diff = diff_kh(str(filed), gen, _agg(invoices=4), *MARCH)
+    # one more A4 row; VetaC totals changed
+    assert [row["c_evid_dd"] for row in diff.added] == ["2024-03-05"]
+    assert [old.get("obrat23") for old, _ in diff.changed] == ["3000"]
+
+
+def test_kh_correction_is_a_nasledne_kh():
+    gen = DHKGenerator.from_profile(PROFILE)
+    veta_d = next(gen.records(_agg(), *MARCH, Correction(date(2024, 5, 2))))
+    assert veta_d.get("khdph_forma") == "N"
+    assert veta_d.get("d_zjist") == "02.05.2024"
+
+    regular = next(gen.records(_agg(), *MARCH))
+    assert regular.get("khdph_forma") == "B"
+    assert regular.get("d_zjist") is None
+
+
+def test_dph_correction_is_a_dodatecne_return():
+    gen = DPHGenerator.from_profile(PROFILE)
+    agg = _agg()
+    records = {el.tag: el for el in gen.records(agg, *MARCH, Correction(date(2024, 5, 2), previous_tax=100))}
+    assert records["VetaD"].get("dapdph_forma") == "D"
+    assert records["VetaD"].get("d_zjist") == "02.05.2024"
+
+    veta6 = records["Veta6"]
+    out_vat, in_vat = int(veta6.get("dan_zocelk")), int(veta6.get("odp_zocelk"))
+    assert (out_vat, in_vat) == (630, 105 + 2400)
+    assert int(veta6.get("dano")) == out_vat - in_vat - 100
+
+    regular = {el.tag: el for el in gen.records(agg, *MARCH)}
+    assert regular["VetaD"].get("dapdph_forma") == "B"
+    assert regular["Veta6"].get("dano") == "0"
+
+
+def test_dph_totals_of_a_filed_return(tmp_path):
+    gen = DPHGenerator.from_profile(PROFILE)
+    filed = tmp_path / "dph_202403.xml"
+    gen.write_file(str(filed), [], *MARCH, aggregates=_agg())
+    previous = read_dph_totals(str(filed))
+
+    assert own_tax(previous) == 630 - 2505
+    assert not dph_changed(previous, dph_totals(gen, _agg(), *MARCH))
+    assert dph_changed(previous, dph_totals(gen, _agg(vat="220.00"), *MARCH))
+
+
+@pytest.mark.parametrize("previous_tax", [0, -1875, 500])
+def test_dano_is_the_change_against_the_filed_tax(previous_tax):
+    gen = DPHGenerator.from_profile(PROFILE)
+    records = gen.records(_agg(), *MARCH, Correction(date(2024, 5, 2), previous_tax=previous_tax))
+    veta6 = next(el for el in records if el.tag == "Veta6")
+    assert int(veta6.get("dano")) == 630 - 2505 - previous_tax
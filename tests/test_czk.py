@@ -0,0 +1,53 @@
+"""Whole-CZK rounding of haléř amounts (DPH / KH)."""
+
+from __future__ import annotations
+
+import pytest
+
+from xml_generators.czk import (
+    czk_ceil_tax,
+    czk_ceil_tax_haler,
+    czk_round_haler,
+    to_haler,
+)
+
+
+@pytest.mark.parametrize(
+    "amount, haler",
+    [(None, 0), ("", 0), (0, 0), ("12.34", 1234), (12.34, 1234), ("0.10", 10), ("-5.5", -550), (1e6, 100000000)],
+)
+def test_to_haler(amount, haler):
+    assert to_haler(amount) == haler
+
+
+@pytest.mark.parametrize(
+    "haler, czk",
+    [(50, 0), (150, 2), (250, 2), (350, 4), (149, 1), (151, 2), (-50, 0), (-150, -2), (-250, -2)],
+)
+def test_czk_round_haler_halves_to_even(haler, czk):
+    assert czk_round_haler(haler) == czk
+
+
+def test_czk_round_haler_matches_round():
+    for haler in range(-2000, 2001):
+        assert czk_round_haler(haler) == round(haler / 100), haler
+
+
+@pytest.mark.parametrize(
+    "haler, czk",
+    [(0, 0), (-1, 0), (-150, 0), (1, 1), (99, 1), (100, 1), (101, 2), (21000, 210)],
+)
+def test_czk_ceil_tax_haler(haler, czk):
+    assert czk_ceil_tax_haler(haler) == czk
+
+
+def test_czk_ceil_tax_haler_matches_float_version():
+    for haler in range(-500, 5001):
+        assert czk_ceil_tax_haler(haler) == czk_ceil_tax(haler / 100), haler
+
+
+def test_haler_rounding_on_arrays():
+    np = pytest.importorskip("numpy")
+    values = np.array([-250, -150, 50, 149, 150, 250, 101], dtype=np.int64)
+    assert czk_round_haler(values).tolist() == [round(v / 100) for v in values.tolist()]
+    assert czk_ceil_tax_haler(values).tolist() == [0, 0, 1, 2, 2, 3, 2]
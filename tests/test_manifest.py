@@ -0,0 +1,122 @@
+"""Incremental runs: which periods `generate_periods` rebuilds."""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import date
+
+import pytest
+
+import main
+from parsers.expense_parser import ExpenseParser
+from parsers.invoice_parser import InvoiceParser
+from tests.test_aggregates import _expense, _invoice
+from xml_generators.manifest import MANIFEST_NAME, BuildManifest
+from xml_generators.taxpayer import TaxpayerProfile
+
+PROFILE = TaxpayerProfile(ico="12345678", dic="CZ12345678", name="Jan Novák")
+JAN = (date(2024, 1, 1), date(2024, 2, 1))
+FEB = (date(2024, 2, 1), date(2024, 3, 1))
+
+
+def _data(extra_invoice: bool = False):
+    invoices = [InvoiceParser.parse(_invoice(i, "1000.00", "210.00")) for i in range(1, 3)]
+    expenses = [ExpenseParser.parse(_expense(1, 21, "500.00", "105.00", "605.00"))]
+    feb = list(invoices)
+    if extra_invoice:
+        feb.append(InvoiceParser.parse(_invoice(9, "50.00", "10.50")))
+    return {JAN: (invoices, expenses), FEB: (feb, expenses)}
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """generate_periods into tmp_path; returns the periods it (re)built."""
+    monkeypatch.setattr(main, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "preload_schemas", lambda *a: None)
+    monkeypatch.setattr(main, "validate_file", lambda path: None)
+    generate_xml = main.generate_xml
+
+    def _run(data=None, profile=PROFILE, **kwargs):
+        built = []
+
+        def recording(*job):
+            built.append(job[2:4])
+            return generate_xml(*job)
+
+        monkeypatch.setattr(main, "generate_xml", recording)
+        paths = main.generate_periods(data or _data(), workers=1, profile=profile, **kwargs)
+        assert [p.name for p in paths] == [
+            "dph_202401.xml", "dhk_202401.xml", "dph_202402.xml", "dhk_202402.xml",
+        ]
+        return built
+
+    return _run
+
+
+def test_first_run_builds_every_period(run, tmp_path):
+    assert run() == [JAN, FEB]
+    assert (tmp_path / MANIFEST_NAME).is_file()
+
+
+def test_unchanged_periods_are_skipped(run, tmp_path):
+    run()
+    before = {p.name: p.stat().st_mtime_ns for p in tmp_path.glob("*.xml")}
+    assert run() == []
+    assert {p.name: p.stat().st_mtime_ns for p in tmp_path.glob("*.xml")} == before
+
+
+def test_changed_input_rebuilds_only_its_period(run):
+    run()
+    assert run(_data(extra_invoice=True)) == [FEB]
+    assert run(_data(extra_invoice=True)) == []
+
+
+def test_changed_profile_rebuilds_everything(run):
+    run()
+    other = TaxpayerProfile(ico="12345678", dic="CZ12345678", name="Jan Novák", city="Brno")
+    assert run(profile=other) == [JAN, FEB]
+
+
+def test_modified_output_is_rebuilt(run, tmp_path):
+    run()
+    dhk = tmp_path / "dhk_202401.xml"
+    dhk.write_bytes(dhk.read_bytes() + b"\n")
+    assert run() == [JAN]
+
+
+def test_touched_output_is_rebuilt(run, tmp_path):
+    run()
+    dph = tmp_path / "dph_202402.xml"
+    st = dph.stat()
+    os.utime(dph, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert run() == [FEB]
+
+
+def test_deleted_output_is_rebuilt(run, tmp_path):
+    run()
+    (tmp_path / "dph_202401.xml").unlink()
+    assert run() == [JAN]
+    assert (tmp_path / "dph_202401.xml").is_file()
+
+
+def test_validate_upgrades_unvalidated_periods(run):
+    run()
+    assert run(validate=True) == [JAN, FEB]
+    assert run(validate=True) == []
+    # validated files are good enough for a run without --validate
+    assert run() == []
+
+
+def test_force_rebuilds_everything(run):
+    run()
+    assert run(force=True) == [JAN, FEB]
+    assert run() == []
+
+
+def test_unreadable_or_outdated_manifest_starts_over(tmp_path):
+    path = tmp_path / MANIFEST_NAME
+    path.write_text("{not json")
+    assert BuildManifest.load(tmp_path).entries == {}
+    path.write_text(json.dumps({"version": -1, "periods": {"202401": {}}}))
+    assert BuildManifest.load(tmp_path).entries == {}
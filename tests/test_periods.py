@@ -0,0 +1,35 @@
+"""Tax periods selected on the command line."""
+
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+
+import main
+
+
+def test_monthly_and_quarterly_ranges():
+    assert main.tax_periods((2023, 12), (2024, 1)) == [
+        (date(2023, 12, 1), date(2024, 1, 1)),
+        (date(2024, 1, 1), date(2024, 2, 1)),
+    ]
+    assert main.tax_periods((2024, 2), (2024, 4), quarterly=True) == [
+        (date(2024, 1, 1), date(2024, 4, 1)),
+        (date(2024, 4, 1), date(2024, 7, 1)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    [
+        (["--to", "2024-03"], "--to needs --from"),
+        (["--from", "2024-05", "--to", "2024-03"], "--to 2024-03 is before --from 2024-05"),
+    ],
+)
+def test_bad_range_is_a_usage_error(monkeypatch, capsys, argv, message):
+    monkeypatch.setattr("sys.argv", ["main.py", *argv])
+    with pytest.raises(SystemExit) as exc:
+        main.main()
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
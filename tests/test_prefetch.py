@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from tests.fakes import FakeResponse, make_client
+
+PAGE_SIZE = 40
+FULL_PAGES = 5
+WINDOW = 3
+
+
+class FakeList:
+    """`_get_list` stand-in: FULL_PAGES full pages, then empty ones."""
+
+    def __init__(self) -> None:
+        self.pages = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path, params, what, *args, **kwargs):
+        page = params["page"]
+        with self._lock:
+            self.pages.append(page)
+        # earlier pages answer last, so completion order != page order
+        time.sleep(0.002 * max(0, WINDOW - (page - 1) % WINDOW))
+        if page > FULL_PAGES:
+            return []
+        return [{"id": (page - 1) * PAGE_SIZE + i} for i in range(PAGE_SIZE)]
+
+
+@pytest.fixture
+def client_and_list(monkeypatch):
+    client = make_client(lambda url, headers, params: FakeResponse(body=[]), prefetch_pages=WINDOW)
+    fake = FakeList()
+    monkeypatch.setattr(client, "_get_list", fake)
+    return client, fake
+
+
+def test_pages_come_in_order(client_and_list):
+    client, _ = client_and_list
+    pages = list(client.iter_invoice_pages())
+    assert len(pages) == FULL_PAGES
+    ids = [row["id"] for page in pages for row in page]
+    assert ids == list(range(FULL_PAGES * PAGE_SIZE))
+
+
+def test_stops_at_first_empty_page_within_the_window(client_and_list):
+    client, fake = client_and_list
+    list(client.iter_expense_pages())
+    requested = sorted(fake.pages)
+    assert len(requested) == len(set(requested))  # no page fetched twice
+    assert requested[: FULL_PAGES + 1] == list(range(1, FULL_PAGES + 2))
+    # past the empty page, at most the rest of the window was in flight
+    assert max(requested) <= FULL_PAGES + WINDOW
+
+
+def test_early_stop_requests_no_more_than_the_window(client_and_list):
+    client, fake = client_and_list
+    pages = client.iter_invoice_pages()
+    next(pages)
+    pages.close()
+    # the initial window plus the one page submitted for the slot just
+    # consumed (pending ones may be cancelled before they start)
+    assert set(fake.pages) <= set(range(1, WINDOW + 2))
+
+
+def test_matches_sequential_pagination(client_and_list):
+    client, fake = client_and_list
+    prefetched = list(client.stream_invoices())
+    client.prefetch_pages = 0
+    fake.pages.clear()
+    assert list(client.stream_invoices()) == prefetched
+    assert fake.pages == list(range(1, FULL_PAGES + 2))
@@ -0,0 +1,114 @@
+"""RequestScheduler pacing and retries, against a fake clock."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from fakturoid.client import RequestScheduler
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def _scheduler(clock, **kwargs):
+    kwargs.setdefault("rate_limit", 60)
+    return RequestScheduler(window=60.0, clock=clock, **kwargs)
+
+
+def test_bucket_allows_a_burst_then_paces(clock):
+    s = _scheduler(clock, rate_limit=3)
+    assert [s.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 3 per minute: one slot every 20 s
+    assert s.reserve() == pytest.approx(20.0)
+    assert s.reserve() == pytest.approx(40.0)
+    assert s.stats["requests"] == 5 and s.stats["waits"] == 2
+
+
+def test_bucket_refills_with_time_up_to_capacity(clock):
+    s = _scheduler(clock, rate_limit=3)
+    for _ in range(3):
+        s.reserve()
+    clock.now += 20.0
+    assert s.reserve() == 0.0
+    clock.now += 3600.0
+    assert [s.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert s.reserve() == pytest.approx(20.0)
+
+
+def test_policy_header_resizes_the_bucket(clock):
+    s = _scheduler(clock, rate_limit=400)
+    s.observe(200, {"X-RateLimit-Policy": "default;q=2;w=10"})
+    assert s.capacity == 2 and s.refill_rate == pytest.approx(0.2)
+    s.observe(200, {"X-RateLimit": "default;r=1;t=10"})
+    assert s.reserve() == 0.0
+    assert s.reserve() == pytest.approx(5.0)
+
+
+def test_exhausted_quota_pauses_until_reset(clock):
+    s = _scheduler(clock)
+    s.observe(429, {"X-RateLimit": "default;r=0;t=30"})
+    assert s.stats["throttled"] == 1
+    assert s.reserve() == pytest.approx(30.0)
+    clock.now += 1.0
+    assert s.reserve() == pytest.approx(29.0)  # still paused
+    clock.now += 60.0
+    assert s.reserve() == 0.0
+
+
+def test_remaining_quota_caps_the_bucket(clock):
+    s = _scheduler(clock)
+    s.observe(200, {"X-RateLimit": "default;r=0"})
+    assert s.stats["throttled"] == 0
+    assert s.reserve() == pytest.approx(1.0)
+
+
+def test_malformed_headers_are_ignored(clock):
+    s = _scheduler(clock)
+    s.observe(200, {"X-RateLimit-Policy": "default;q=abc;w", "X-RateLimit": "garbage"})
+    assert s.capacity == 60 and s.reserve() == 0.0
+
+
+def test_retry_statuses_and_attempt_limit(clock):
+    s = _scheduler(clock, max_retries=2)
+    assert s.should_retry(429, 0) and s.should_retry(503, 1)
+    assert not s.should_retry(503, 2)
+    assert not s.should_retry(404, 0) and not s.should_retry(401, 0)
+
+
+def test_retry_after_seconds_wins_and_pauses_everyone(clock):
+    s = _scheduler(clock)
+    assert s.retry_delay(4, {"Retry-After": "7"}) == 7.0
+    assert s.reserve() == pytest.approx(7.0)
+    assert s.stats["retried"] == 1
+
+
+def test_retry_after_http_date(clock):
+    s = _scheduler(clock)
+    when = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert s.retry_delay(0, {"Retry-After": format_datetime(when, usegmt=True)}) == pytest.approx(120, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(seconds=120)
+    assert s.retry_delay(0, {"Retry-After": format_datetime(past, usegmt=True)}) == 0.0
+
+
+def test_backoff_is_full_jitter_capped(clock, monkeypatch):
+    s = _scheduler(clock, backoff_base=1.0, backoff_max=10.0)
+    bounds = []
+    monkeypatch.setattr("fakturoid.client.random.uniform", lambda lo, hi: bounds.append((lo, hi)) or hi)
+    delays = [s.retry_delay(attempt, {"Retry-After": "soon"}) for attempt in range(6)]
+    assert delays == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+    assert all(lo == 0 for lo, _ in bounds)
+    # no Retry-After: the backoff does not pause other requests
+    assert s.reserve() == 0.0
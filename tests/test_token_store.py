@@ -0,0 +1,99 @@
+"""OAuth tokens reused across runs (TokenStore) and refreshed by the client."""
+
+from __future__ import annotations
+
+import stat
+import time
+
+import pytest
+import requests
+
+from fakturoid.token_store import StoredToken, TokenStore
+from tests.fakes import FakeResponse, make_client
+
+ROWS = [{"id": 1}]
+
+
+def _ok(url, headers, params):
+    return FakeResponse(200, ROWS)
+
+
+def _token(access_token: str, expires_in: float) -> StoredToken:
+    return StoredToken(access_token, "Bearer", time.time() + expires_in)
+
+
+def test_validity_honours_the_expiry_margin():
+    token = StoredToken("t", "Bearer", expires_at=1000.0)
+    assert token.is_valid(now=1000.0 - StoredToken.EXPIRY_MARGIN - 1)
+    assert not token.is_valid(now=1000.0 - StoredToken.EXPIRY_MARGIN)
+    assert StoredToken("t", "Bearer", expires_at=0).is_valid()
+
+
+def test_stored_token_is_reused(tmp_path):
+    store = TokenStore(tmp_path / "tokens.json")
+    store.save("id", _token("stored", StoredToken.EXPIRY_MARGIN + 60))
+    client = make_client(_ok, token_store=store)
+
+    assert client.list_invoices() == ROWS
+    assert client.session.tokens_issued == 0
+    assert client.session.gets[0]["headers"]["Authorization"] == "Bearer stored"
+
+
+def test_token_inside_the_margin_is_refreshed_and_stored(tmp_path):
+    store = TokenStore(tmp_path / "tokens.json")
+    store.save("id", _token("stale", StoredToken.EXPIRY_MARGIN - 1))
+    client = make_client(_ok, token_store=store)
+
+    client.list_invoices()
+    assert client.session.tokens_issued == 1
+    assert store.load("id").access_token == "t1"
+    # the next client (next run) reuses it
+    other = make_client(_ok, token_store=store)
+    other.list_invoices()
+    assert other.session.tokens_issued == 0
+
+
+def test_expired_token_in_memory_is_refreshed():
+    client = make_client(_ok, expires_in=StoredToken.EXPIRY_MARGIN)
+    client.list_invoices()
+    client.list_invoices()
+    assert client.session.tokens_issued == 2
+
+
+def test_rejected_token_is_dropped_and_the_request_retried_once(tmp_path):
+    def revoked_t1(url, headers, params):
+        if headers["Authorization"] == "Bearer t1":
+            return FakeResponse(401)
+        return FakeResponse(200, ROWS)
+
+    store = TokenStore(tmp_path / "tokens.json")
+    client = make_client(revoked_t1, token_store=store)
+
+    assert client.list_invoices() == ROWS
+    assert [g["headers"]["Authorization"] for g in client.session.gets] == ["Bearer t1", "Bearer t2"]
+    assert store.load("id").access_token == "t2"
+
+
+def test_second_401_is_raised():
+    client = make_client(lambda url, headers, params: FakeResponse(401))
+    with pytest.raises(requests.HTTPError):
+        client.list_invoices()
+    assert len(client.session.gets) == 2
+
+
+def test_invalidate_keeps_a_token_replaced_meanwhile(tmp_path):
+    store = TokenStore(tmp_path / "tokens.json")
+    store.save("id", _token("new", 3600))
+    store.invalidate("id", "old")
+    assert store.load("id").access_token == "new"
+    store.invalidate("id", "new")
+    assert store.load("id") is None
+
+
+def test_file_is_private_and_holds_no_secrets(tmp_path):
+    path = tmp_path / "cache" / "tokens.json"
+    TokenStore(path).save("client-id", _token("secret-token", 3600))
+
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert stat.S_IMODE(path.parent.stat().st_mode) == 0o700
+    assert "client-id" not in path.read_text()
@@ -0,0 +1,57 @@
+"""Generated DPH / KH files against the shipped structure schemas."""
+
+from __future__ import annotations
+
+import copy
+from datetime import date
+
+import pytest
+
+from parsers.expense_parser import ExpenseParser
+from parsers.invoice_parser import InvoiceParser
+from tests.test_aggregates import _expense, _invoice
+from xml_generators.aggregates import TaxAggregates
+from xml_generators.corrective import Correction
+from xml_generators.dhk_generator import DHKGenerator
+from xml_generators.dph_generator import DPHGenerator
+from xml_generators.taxpayer import TaxpayerProfile
+from xml_generators.validation import SchemaValidationError, missing_schemas, validate_tree
+
+PROFILE = TaxpayerProfile(ico="12345678", dic="CZ12345678", name="Ing. Jan Novák", city="Praha")
+PERIODS = [(date(2024, 3, 1), date(2024, 4, 1)), (date(2024, 1, 1), date(2024, 4, 1))]
+
+
+@pytest.fixture(scope="module")
+def agg():
+    invoices = [InvoiceParser.parse(_invoice(i, "1000.00", "210.00")) for i in range(1, 4)]
+    expenses = [
+        ExpenseParser.parse(_expense(1, 21, "500.00", "105.00", "605.00")),
+        ExpenseParser.parse(_expense(2, 12, "20000.00", "2400.00", "22400.00")),
+    ]
+    return TaxAggregates.compute(invoices, expenses)
+
+
+def test_schemas_are_shipped():
+    assert missing_schemas() == []
+
+
+@pytest.mark.parametrize("generator", [DPHGenerator, DHKGenerator])
+@pytest.mark.parametrize("period", PERIODS)
+@pytest.mark.parametrize("correction", [None, Correction(date(2024, 5, 2), previous_tax=100)])
+def test_generated_forms_are_valid(agg, generator, period, correction):
+    tree = generator.from_profile(PROFILE).build_tree([], *period, aggregates=agg, correction=correction)
+    validate_tree(tree.getroot())
+
+
+def test_invalid_form_is_rejected(agg):
+    root = DPHGenerator.from_profile(PROFILE).build_tree([], *PERIODS[0], aggregates=agg).getroot()
+    root.find("DPHDP3/Veta1").set("obrat23", "3000.50")
+    with pytest.raises(SchemaValidationError, match="obrat23"):
+        validate_tree(root, "dph.xml")
+
+
+def test_misplaced_sentence_is_rejected(agg):
+    root = DHKGenerator.from_profile(PROFILE).build_tree([], *PERIODS[0], aggregates=agg).getroot()
+    root.find("DPHKH1").append(copy.copy(root.find("DPHKH1/VetaD")))
+    with pytest.raises(SchemaValidationError):
+        validate_tree(root, "dhk.xml")
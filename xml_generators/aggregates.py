@@ -0,0 +1,153 @@
+"""Per-period totals shared by the DPH and KH generators (amounts in haléře)."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from parsers.expense_parser import ParsedExpense
+from parsers.invoice_parser import ParsedInvoice
+from xml_generators.czk import HALER_PER_CZK
+
+if TYPE_CHECKING:
+    from parsers.columnar import ExpenseTable, InvoiceTable
+
+logger = logging.getLogger(__name__)
+
+# KH: expenses above 10 000 Kč incl. VAT are reported row by row (B2)
+KH_ROW_THRESHOLD_HALER = 10000 * HALER_PER_CZK
+
+
+@dataclass
+class TaxAggregates:
+    """
+    Everything DPH and KH need from one period's documents, collected in a
+    single pass over the invoices and a single pass over the expenses.
+    """
+
+    # DIČ on the first invoice (falls back to config when None)
+    taxpayer_dic: Optional[str] = None
+    # invoices in input order – one KH A4 row each
+    invoices: List[ParsedInvoice] = field(default_factory=list)
+    # output VAT (DPH ř. 1, KH obrat23)
+    out_base: int = 0
+    out_vat: int = 0
+    # input VAT of all included expenses (DPH ř. 40 / 41)
+    in_base_21: int = 0
+    in_vat_21: int = 0
+    in_base_12: int = 0
+    in_vat_12: int = 0
+    # KH B2: expenses over the threshold with supplier DIČ and some VAT
+    kh_rows: List[ParsedExpense] = field(default_factory=list)
+    b2_base_21: int = 0
+    b2_base_12: int = 0
+    # KH B3: expenses at or under the threshold, aggregated
+    b3_count: int = 0
+    b3_base_21: int = 0
+    b3_vat_21: int = 0
+    b3_base_12: int = 0
+    b3_vat_12: int = 0
+
+    @property
+    def kh_pln23(self) -> int:
+        """KH VetaC pln23: B2 + B3 bases at the basic rate."""
+        return self.b2_base_21 + self.b3_base_21
+
+    @property
+    def kh_pln5(self) -> int:
+        """KH VetaC pln5: B2 + B3 bases at the reduced rate."""
+        return self.b2_base_12 + self.b3_base_12
+
+    @staticmethod
+    def _warn_omitted(exp: ParsedExpense) -> None:
+        if not exp.supplier_dic:
+            logger.warning(
+                "Expense %s over 10k CZK incl. VAT has no supplier DIČ — "
+                "omitted from KH B2/B3 (fix in Fakturoid); DPH still includes it if parsed.",
+                exp.number or exp.evidence_number,
+            )
+        else:
+            logger.warning(
+                "Expense %s has no VAT bases in summary — skipping B2",
+                exp.number or exp.evidence_number,
+            )
+
+    @classmethod
+    def compute(
+        cls,
+        invoices: Iterable[ParsedInvoice],
+        expenses: Optional[Iterable[ParsedExpense]] = None,
+    ) -> "TaxAggregates":
+        agg = cls()
+        for inv in invoices:
+            if not agg.invoices and inv.taxpayer_dic:
+                agg.taxpayer_dic = inv.taxpayer_dic.replace("CZ", "").replace("cz", "")
+            agg.invoices.append(inv)
+            agg.out_base += inv.vat_base_haler
+            agg.out_vat += inv.vat_amount_haler
+
+        for exp in expenses or ():
+            b1, v1 = exp.base_21_haler, exp.vat_21_haler
+            b2, v2 = exp.base_12_haler, exp.vat_12_haler
+            agg.in_base_21 += b1
+            agg.in_vat_21 += v1
+            agg.in_base_12 += b2
+            agg.in_vat_12 += v2
+            if exp.total_with_vat_haler <= KH_ROW_THRESHOLD_HALER:
+                agg.b3_count += 1
+                agg.b3_base_21 += b1
+                agg.b3_vat_21 += v1
+                agg.b3_base_12 += b2
+                agg.b3_vat_12 += v2
+            elif not (exp.supplier_dic and (b1 or v1 or b2 or v2)):
+                cls._warn_omitted(exp)
+            else:
+                agg.kh_rows.append(exp)
+                agg.b2_base_21 += b1
+                agg.b2_base_12 += b2
+        return agg
+
+    @classmethod
+    def from_tables(
+        cls,
+        invoices: List[ParsedInvoice],
+        expenses: List[ParsedExpense],
+        invoice_table: Optional["InvoiceTable"] = None,
+        expense_table: Optional["ExpenseTable"] = None,
+    ) -> "TaxAggregates":
+        """
+        `compute` as reductions over `parsers.columnar` tables (row i of a
+        table is document i of its list). Only worth it when the tables are
+        built once and reused: building them from the models costs more than
+        `compute` itself (see benchmarks/bench_columnar.py). Needs NumPy.
+        """
+        import numpy as np
+
+        from parsers.columnar import ExpenseTable, InvoiceTable
+
+        agg = cls(invoices=list(invoices))
+        if invoices and invoices[0].taxpayer_dic:
+            agg.taxpayer_dic = invoices[0].taxpayer_dic.replace("CZ", "").replace("cz", "")
+        invoice_table = invoice_table or InvoiceTable.from_parsed(invoices)
+        agg.out_base, agg.out_vat = invoice_table.totals()
+
+        table = expense_table or ExpenseTable.from_parsed(expenses)
+        dph = table.dph_totals()
+        agg.in_base_21, agg.in_vat_21 = dph["base_21"], dph["vat_21"]
+        agg.in_base_12, agg.in_vat_12 = dph["base_12"], dph["vat_12"]
+
+        split = table.kh_split(KH_ROW_THRESHOLD_HALER)
+        b3 = split["b3"]
+        agg.b3_count = int(b3.sum())
+        b3_totals = table.dph_totals(b3)
+        agg.b3_base_21, agg.b3_vat_21 = b3_totals["base_21"], b3_totals["vat_21"]
+        agg.b3_base_12, agg.b3_vat_12 = b3_totals["base_12"], b3_totals["vat_12"]
+
+        for i in np.flatnonzero(split["missing_dic"] | split["no_vat"]):
+            cls._warn_omitted(expenses[i])
+        b2 = split["b2"]
+        agg.kh_rows = [expenses[i] for i in np.flatnonzero(b2)]
+        b2_totals = table.dph_totals(b2)
+        agg.b2_base_21, agg.b2_base_12 = b2_totals["base_21"], b2_totals["base_12"]
+        return agg
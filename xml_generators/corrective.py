@@ -0,0 +1,186 @@
+"""
+Corrective filings: následné KH and dodatečné DPH.
+
+A filed KH is read once into a `KhIndex` – rows keyed by section,
+`c_evid_dd` and the counterparty DIČ (`dic_odb` for A4, `dic_dod` for B2;
+B3 and C are single rows keyed by section) – and the rows regenerated from
+the current documents are matched against it in one pass, so the diff is
+linear in the number of rows. Keys are not unique (one document number can
+repeat for a customer), so each key holds a multiset of rows: identical
+rows match first, the leftovers of a key pair up as changed, and what
+remains is added or removed.
+
+The following KH itself is complete – EPO replaces the whole previous
+report – the diff decides whether one is needed and what to report.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+from lxml import etree
+
+if TYPE_CHECKING:
+    from xml_generators.aggregates import TaxAggregates
+    from xml_generators.dhk_generator import DHKGenerator
+    from xml_generators.dph_generator import DPHGenerator
+
+# KH sections and the attribute naming the counterparty
+KH_ROW_DIC = {"VetaA4": "dic_odb", "VetaB2": "dic_dod", "VetaB3": None, "VetaC": None}
+# DPH lines compared for a supplementary return (VetaD / VetaP are headers)
+DPH_TOTAL_TAGS = ("Veta1", "Veta4", "Veta6")
+
+Row = Dict[str, str]
+RowKey = Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Correction:
+    """File a corrective form: KH `khdph_forma="N"`, DPH `dapdph_forma="D"`."""
+
+    # d_zjist: when the reasons for the correction were found
+    found_on: date
+    # DPH only: tax of the last filed return, ř. 64 − ř. 65 (for ř. 66 `dano`)
+    previous_tax: int = 0
+
+    @property
+    def d_zjist(self) -> str:
+        return self.found_on.strftime("%d.%m.%Y")
+
+
+def _row_key(tag: str, attrs: Row) -> RowKey:
+    dic_attr = KH_ROW_DIC[tag]
+    if dic_attr is None:
+        return (tag,)
+    return (tag, attrs.get("c_evid_dd", ""), attrs.get(dic_attr, ""))
+
+
+def _row_value(attrs: Row) -> Tuple[Tuple[str, str], ...]:
+    # row numbers shift whenever a row is added or removed – not a change
+    return tuple(sorted((k, v) for k, v in attrs.items() if k != "c_radku"))
+
+
+@dataclass
+class KhDiff:
+    added: List[Row] = field(default_factory=list)
+    removed: List[Row] = field(default_factory=list)
+    changed: List[Tuple[Row, Row]] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+class KhIndex:
+    """Rows of a filed KH by (section, c_evid_dd, DIČ)."""
+
+    def __init__(self, rows: Iterable[Tuple[str, Row]] = ()) -> None:
+        # key -> row value -> rows with that value
+        self._rows: Dict[RowKey, Dict[tuple, List[Row]]] = defaultdict(lambda: defaultdict(list))
+        self.size = 0
+        for tag, attrs in rows:
+            self._rows[_row_key(tag, attrs)][_row_value(attrs)].append(attrs)
+            self.size += 1
+
+    @classmethod
+    def from_file(cls, path: str) -> "KhIndex":
+        """Index a KH file, streaming (elements are dropped once read)."""
+
+        def rows() -> Iterable[Tuple[str, Row]]:
+            for _, el in etree.iterparse(path, events=("end",), tag=tuple(KH_ROW_DIC)):
+                yield el.tag, dict(el.attrib)
+                el.clear()
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
+
+        return cls(rows())
+
+    def diff(self, current: Iterable[etree._Element]) -> KhDiff:
+        """
+        Match the current KH records (any elements; headers are ignored)
+        against the index. The index is left unchanged.
+        """
+        result = KhDiff()
+        used: Dict[RowKey, Dict[tuple, int]] = defaultdict(lambda: defaultdict(int))
+        unmatched: Dict[RowKey, List[Row]] = defaultdict(list)
+        for el in current:
+            if el.tag not in KH_ROW_DIC:
+                continue
+            attrs = dict(el.attrib)
+            key, value = _row_key(el.tag, attrs), _row_value(attrs)
+            bucket = self._rows.get(key)
+            if bucket and used[key][value] < len(bucket.get(value, ())):
+                used[key][value] += 1
+                result.unchanged += 1
+            else:
+                unmatched[key].append(attrs)
+        for key, bucket in self._rows.items():
+            leftover = [
+                row
+                for value, rows in bucket.items()
+                for row in rows[used[key][value] :]
+            ]
+            new = unmatched.pop(key, [])
+            result.changed += zip(leftover, new)
+            result.removed += leftover[len(new) :]
+            result.added += new[len(leftover) :]
+        for new in unmatched.values():
+            result.added += new
+        return result
+
+
+def diff_kh(
+    previous_path: str,
+    generator: "DHKGenerator",
+    agg: "TaxAggregates",
+    period_from: date,
+    period_to: date,
+) -> KhDiff:
+    """Diff a filed KH against the KH the current documents would produce."""
+    return KhIndex.from_file(previous_path).diff(generator.records(agg, period_from, period_to))
+
+
+def read_dph_totals(path: str) -> Dict[str, Row]:
+    """Veta1 / Veta4 / Veta6 of a filed DPH return."""
+    root = etree.parse(path).getroot()
+    return {el.tag: dict(el.attrib) for el in root.iter(*DPH_TOTAL_TAGS)}
+
+
+def dph_totals(
+    generator: "DPHGenerator",
+    agg: "TaxAggregates",
+    period_from: date,
+    period_to: date,
+) -> Dict[str, Row]:
+    """Veta1 / Veta4 / Veta6 the current documents would produce."""
+    return {
+        el.tag: dict(el.attrib)
+        for el in generator.records(agg, period_from, period_to)
+        if el.tag in DPH_TOTAL_TAGS
+    }
+
+
+def own_tax(totals: Dict[str, Row]) -> int:
+    """ř. 64 − ř. 65: own tax liability (+) or excess deduction (−)."""
+    veta6 = totals.get("Veta6", {})
+    return int(veta6.get("dano_da", "0")) - int(veta6.get("dano_no", "0"))
+
+
+def dph_changed(previous: Dict[str, Row], current: Dict[str, Row]) -> bool:
+    """Whether the DPH lines differ (ř. 66 `dano` itself is not compared)."""
+    for tag in DPH_TOTAL_TAGS:
+        old = {k: v for k, v in previous.get(tag, {}).items() if k != "dano"}
+        new = {k: v for k, v in current.get(tag, {}).items() if k != "dano"}
+        if old != new:
+            return True
+    return False
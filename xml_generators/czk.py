@@ -1,8 +1,18 @@
-"""CZK amount helpers for DPH / KH XML (whole koruny)."""
+"""
+CZK amount helpers for DPH / KH XML (whole koruny).
+
+Amounts are carried as integer haléře from parse time (`to_haler`), so sums
+over any number of documents are exact; `czk_round_haler` /
+`czk_ceil_tax_haler` turn them into whole CZK. Both are plain integer
+arithmetic and work unchanged on NumPy integer arrays (element-wise).
+"""
 
 from __future__ import annotations
 
 import math
+from typing import Any, Optional, Union
+
+HALER_PER_CZK = 100
 
 
 def czk_round(amount: float) -> int:
@@ -15,3 +25,29 @@ def czk_ceil_tax(amount: float) -> int:
     if amount <= 0:
         return 0
     return math.ceil(amount - 1e-9)
+
+
+def to_haler(amount: Optional[Union[str, float, int]]) -> int:
+    """
+    Fakturoid amount (number or decimal string, at most 2 places) → haléře.
+    Exact: the float error of a 2-place amount is far below half a haléř.
+    """
+    if not amount:
+        return 0
+    return int(round(float(amount) * HALER_PER_CZK))
+
+
+def czk_round_haler(haler: Any) -> Any:
+    """
+    `czk_round` for haléře: whole CZK, halves to even like Python's
+    `round()` (so results match the former float code on exact amounts).
+    """
+    czk, rest = divmod(haler, HALER_PER_CZK)
+    half = HALER_PER_CZK // 2
+    return czk + ((rest > half) | ((rest == half) & (czk % 2 == 1)))
+
+
+def czk_ceil_tax_haler(haler: Any) -> Any:
+    """`czk_ceil_tax` for haléře: whole CZK rounded up, 0 for amounts <= 0."""
+    czk = -(-haler // HALER_PER_CZK)
+    return czk * (czk > 0)
@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import hashlib
 import logging
-import os
 from datetime import date, datetime
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, Optional
 
 from lxml import etree
 
 from parsers.expense_parser import ParsedExpense
 from parsers.invoice_parser import ParsedInvoice
-from xml_generators.czk import czk_ceil_tax, czk_round
+from xml_generators import output
+from xml_generators.aggregates import TaxAggregates
+from xml_generators.corrective import Correction
+from xml_generators.czk import czk_ceil_tax_haler, czk_round_haler
+from xml_generators.periods import period_attrs
+from xml_generators.taxpayer import TaxpayerProfile
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +22,12 @@ logger = logging.getLogger(__name__)
 class DHKGenerator:
     """
     Kontrolní hlášení (KH / DHK) XML generator.
-    
+
     Generates DPHKH1 format matching the official Finanční správa schema.
     """
 
+    PISEMNOST_ATTRS = {"nazevSW": "EPO MF ČR", "verzeSW": "46.2.1"}
+
     def __init__(
         self,
         taxpayer_ico: str,
@@ -41,23 +47,52 @@ class DHKGenerator:
         taxpayer_ufo: str = "451",
         taxpayer_pracufo: str = "2002",
     ) -> None:
-        self.taxpayer_ico = taxpayer_ico
-        # Strip CZ prefix if present
-        self.taxpayer_dic = taxpayer_dic.replace("CZ", "").replace("cz", "")
-        self.taxpayer_name = taxpayer_name
-        self.taxpayer_title = taxpayer_title
-        self.taxpayer_first_name = taxpayer_first_name
-        self.taxpayer_last_name = taxpayer_last_name
-        self.taxpayer_street = taxpayer_street
-        self.taxpayer_house_number = taxpayer_house_number
-        self.taxpayer_house_number_pop = taxpayer_house_number_pop
-        self.taxpayer_city = taxpayer_city
-        self.taxpayer_zip = taxpayer_zip
-        self.taxpayer_country = taxpayer_country
-        self.taxpayer_email = taxpayer_email
-        self.taxpayer_phone = taxpayer_phone
-        self.taxpayer_ufo = taxpayer_ufo
-        self.taxpayer_pracufo = taxpayer_pracufo
+        self._use_profile(
+            TaxpayerProfile(
+                ico=taxpayer_ico,
+                dic=taxpayer_dic,
+                name=taxpayer_name,
+                title=taxpayer_title,
+                first_name=taxpayer_first_name,
+                last_name=taxpayer_last_name,
+                street=taxpayer_street,
+                house_number=taxpayer_house_number,
+                house_number_pop=taxpayer_house_number_pop,
+                city=taxpayer_city,
+                zip=taxpayer_zip,
+                country=taxpayer_country,
+                email=taxpayer_email,
+                phone=taxpayer_phone,
+                ufo=taxpayer_ufo,
+                pracufo=taxpayer_pracufo,
+            )
+        )
+
+    @classmethod
+    def from_profile(cls, profile: TaxpayerProfile) -> "DHKGenerator":
+        """Generator for an already loaded profile, sharing its cached headers."""
+        gen = cls.__new__(cls)
+        gen._use_profile(profile)
+        return gen
+
+    def _use_profile(self, profile: TaxpayerProfile) -> None:
+        self.profile = profile
+        self.taxpayer_ico = profile.ico
+        self.taxpayer_dic = profile.dic
+        self.taxpayer_name = profile.name
+        self.taxpayer_title = profile.title
+        self.taxpayer_first_name = profile.first_name
+        self.taxpayer_last_name = profile.last_name
+        self.taxpayer_street = profile.street
+        self.taxpayer_house_number = profile.house_number
+        self.taxpayer_house_number_pop = profile.house_number_pop
+        self.taxpayer_city = profile.city
+        self.taxpayer_zip = profile.zip
+        self.taxpayer_country = profile.country
+        self.taxpayer_email = profile.email
+        self.taxpayer_phone = profile.phone
+        self.taxpayer_ufo = profile.ufo
+        self.taxpayer_pracufo = profile.pracufo
 
     @staticmethod
     def _parse_evid_date_from_invoice_number(invoice_number: str) -> Optional[str]:
@@ -70,123 +105,69 @@ class DHKGenerator:
             return None
 
     @staticmethod
-    def _format_dan(vat: float) -> str:
-        return f"{czk_ceil_tax(vat)}"
+    def _format_dan(vat_haler: int) -> str:
+        return f"{czk_ceil_tax_haler(vat_haler)}"
 
-    def build_tree(
+    def _final_taxpayer_dic(self, agg: TaxAggregates) -> str:
+        # Use taxpayer_dic from first invoice if available, otherwise fall back to config
+        return agg.taxpayer_dic or self.taxpayer_dic
+
+    def records(
         self,
-        invoices: Iterable[ParsedInvoice],
+        agg: TaxAggregates,
         period_from: date,
         period_to: date,
-        expenses: Optional[Iterable[ParsedExpense]] = None,
-    ) -> etree._ElementTree:
-        # Get taxpayer_dic from first invoice if available
-        taxpayer_dic_from_invoice = None
-        invoice_list = list(invoices)
-        if invoice_list:
-            first_inv = invoice_list[0]
-            if first_inv.taxpayer_dic:
-                taxpayer_dic_from_invoice = first_inv.taxpayer_dic.replace("CZ", "").replace("cz", "")
-        
-        # Use taxpayer_dic from invoice if available, otherwise fall back to config
-        final_taxpayer_dic = taxpayer_dic_from_invoice or self.taxpayer_dic
-        
-        # Root: Pisemnost
-        root = etree.Element("Pisemnost", nazevSW="EPO MF ČR", verzeSW="46.2.1")
-        
-        # DPHKH1 document
-        dhkh1 = etree.SubElement(root, "DPHKH1", verzePis="03.01")
-        
+        correction: Optional[Correction] = None,
+    ) -> Iterator[etree._Element]:
+        """DPHKH1 children in document order, one element at a time."""
         # VetaD - Document header
-        month = period_from.month
         year = period_from.year
         submission_date = datetime.now().strftime("%d.%m.%Y")
-        veta_d = etree.SubElement(
-            dhkh1,
-            "VetaD",
+        veta_d = dict(
             dokument="KH1",
             k_uladis="DPH",
-            mesic=str(month),
+            **period_attrs(period_from, period_to),
             rok=str(year),
             d_poddp=submission_date,
-            khdph_forma="B",
+            # řádné, or následné (complete data) when correcting a filed KH
+            khdph_forma="N" if correction else "B",
         )
-        
-        # VetaP - Taxpayer info
-        # Parse name if not provided separately
-        first_name = self.taxpayer_first_name
-        last_name = self.taxpayer_last_name
-        title = self.taxpayer_title
-        
-        if not first_name and not last_name:
-            # Try to parse title and name from taxpayer_name
-            name_parts = self.taxpayer_name.split()
-            common_titles = ["Ing.", "Mgr.", "Bc.", "MUDr.", "JUDr.", "Dr.", "PhDr.", "RNDr."]
-            
-            if len(name_parts) >= 3 and name_parts[0] in common_titles:
-                # Title + first + last
-                if not title:
-                    title = name_parts[0]
-                first_name = name_parts[1]
-                last_name = " ".join(name_parts[2:])
-            elif len(name_parts) == 2:
-                first_name = name_parts[0]
-                last_name = name_parts[1]
-            else:
-                first_name = self.taxpayer_name
-                last_name = ""
-        
-        veta_p = etree.SubElement(
-            dhkh1,
-            "VetaP",
-            c_ufo=self.taxpayer_ufo,
-            c_pracufo=self.taxpayer_pracufo,
-            dic=final_taxpayer_dic,
-            typ_ds="F",
-            titul=title or "",
-            jmeno=first_name,
-            prijmeni=last_name,
-            ulice=self.taxpayer_street or "",
-            c_orient=self.taxpayer_house_number or "",
-            c_pop=self.taxpayer_house_number_pop or "",
-            naz_obce=self.taxpayer_city or "",
-            psc=self.taxpayer_zip or "",
-            stat=self.taxpayer_country,
-            email=self.taxpayer_email or "",
-            c_telef=self.taxpayer_phone or "",
+        if correction:
+            veta_d["d_zjist"] = correction.d_zjist
+        yield etree.Element("VetaD", veta_d)
+
+        # VetaP - Taxpayer info (cached on the profile)
+        yield etree.Element(
+            "VetaP", self.profile.veta_p_attrs("DPHKH1", self._final_taxpayer_dic(agg))
         )
-        
+
         # VetaA4 - Invoice data (one per invoice)
-        total_base = 0.0
         row_num = 1
-        
-        for inv in invoice_list:
-            # Calculate totals for 21% VAT rate
-            base = inv.vat_base
-            vat = inv.vat_amount
-            
-            total_base += base
-            
+
+        for inv in agg.invoices:
+            # 21% VAT rate amounts (haléře)
+            base = inv.vat_base_haler
+            vat = inv.vat_amount_haler
+
             # Format taxable supply date as DD.MM.YYYY for dppd
             supply_date_str = (
                 inv.taxable_supply_date.strftime("%d.%m.%Y")
                 if inv.taxable_supply_date
                 else inv.issue_date.strftime("%d.%m.%Y")
             )
-            
+
             # Parse evidence date from invoice number (if it's in YYYY-MM-DD format)
             evid_date = self._parse_evid_date_from_invoice_number(inv.invoice_number)
             if not evid_date:
                 # Fallback to issue_date if invoice number doesn't contain date
                 evid_date = inv.issue_date.strftime("%Y-%m-%d")
-            
+
             # Format amounts: zakl_dane1 as integer (no decimal), dan1 as integer if whole, otherwise 2 decimals
             # Both are in CZK, stored as strings
-            zakl_dane1 = f"{czk_round(base)}"
+            zakl_dane1 = f"{czk_round_haler(base)}"
             dan1 = self._format_dan(vat)
-            
-            veta_a4 = etree.SubElement(
-                dhkh1,
+
+            yield etree.Element(
                 "VetaA4",
                 c_radku=str(row_num),
                 dic_odb=inv.customer_dic or "",
@@ -199,122 +180,131 @@ class DHKGenerator:
             )
             row_num += 1
 
-        expense_list: List[ParsedExpense] = list(expenses or [])
-        pln23_kh = 0.0
-        pln5_kh = 0.0
-
-        for exp in expense_list:
-            if exp.total_with_vat > 10000 and not exp.supplier_dic:
-                logger.warning(
-                    "Expense %s over 10k CZK incl. VAT has no supplier DIČ — "
-                    "omitted from KH B2/B3 (fix in Fakturoid); DPH still includes it if parsed.",
-                    exp.number or exp.evidence_number,
-                )
-                continue
-            if exp.total_with_vat > 10000 and exp.supplier_dic:
-                dppd = exp.dppd_for_kh().strftime("%d.%m.%Y")
-                evid = exp.evidence_number or exp.number or str(row_num)
-                sd = exp.supplier_dic
-                if len(sd) > 10:
-                    sd = sd[-10:]
-                dic_dod = sd.zfill(10)
-                b1, v1 = exp.base_21, exp.vat_21
-                b2, v2 = exp.base_12, exp.vat_12
-                if not (b1 or v1 or b2 or v2):
-                    logger.warning(
-                        "Expense %s has no VAT bases in summary — skipping B2",
-                        exp.number or exp.evidence_number,
-                    )
-                    continue
-                pln23_kh += b1
-                pln5_kh += b2
-                attrs = dict(
-                    c_radku=str(row_num),
-                    dic_dod=dic_dod,
-                    c_evid_dd=evid[:60],
-                    dppd=dppd,
-                    pomer="N",
-                    zdph_44="N",
-                )
-                if b1 or v1:
-                    attrs["zakl_dane1"] = f"{czk_round(b1)}"
-                    attrs["dan1"] = self._format_dan(v1)
-                if b2 or v2:
-                    attrs["zakl_dane2"] = f"{czk_round(b2)}"
-                    attrs["dan2"] = self._format_dan(v2)
-                etree.SubElement(dhkh1, "VetaB2", **attrs)
-                row_num += 1
-
-        small = [e for e in expense_list if e.total_with_vat <= 10000]
-        if small:
-            sb1 = sum(e.base_21 for e in small)
-            sv1 = sum(e.vat_21 for e in small)
-            sb2 = sum(e.base_12 for e in small)
-            sv2 = sum(e.vat_12 for e in small)
-            pln23_kh += sb1
-            pln5_kh += sb2
+        # VetaB2 - expenses over 10k with supplier DIČ (selected in TaxAggregates)
+        for exp in agg.kh_rows:
+            dppd = exp.dppd_for_kh().strftime("%d.%m.%Y")
+            evid = exp.evidence_number or exp.number or str(row_num)
+            sd = exp.supplier_dic or ""
+            if len(sd) > 10:
+                sd = sd[-10:]
+            dic_dod = sd.zfill(10)
+            b1, v1 = exp.base_21_haler, exp.vat_21_haler
+            b2, v2 = exp.base_12_haler, exp.vat_12_haler
+            attrs = dict(
+                c_radku=str(row_num),
+                dic_dod=dic_dod,
+                c_evid_dd=evid[:60],
+                dppd=dppd,
+                pomer="N",
+                zdph_44="N",
+            )
+            if b1 or v1:
+                attrs["zakl_dane1"] = f"{czk_round_haler(b1)}"
+                attrs["dan1"] = self._format_dan(v1)
+            if b2 or v2:
+                attrs["zakl_dane2"] = f"{czk_round_haler(b2)}"
+                attrs["dan2"] = self._format_dan(v2)
+            yield etree.Element("VetaB2", **attrs)
+            row_num += 1
+
+        # VetaB3 - expenses up to 10k, aggregated
+        if agg.b3_count:
+            sb1, sv1 = agg.b3_base_21, agg.b3_vat_21
+            sb2, sv2 = agg.b3_base_12, agg.b3_vat_12
             b3attrs = {}
             if sb1 or sv1:
-                b3attrs["zakl_dane1"] = f"{czk_round(sb1)}"
+                b3attrs["zakl_dane1"] = f"{czk_round_haler(sb1)}"
                 b3attrs["dan1"] = self._format_dan(sv1)
             if sb2 or sv2:
-                b3attrs["zakl_dane2"] = f"{czk_round(sb2)}"
+                b3attrs["zakl_dane2"] = f"{czk_round_haler(sb2)}"
                 b3attrs["dan2"] = self._format_dan(sv2)
             if b3attrs:
-                etree.SubElement(dhkh1, "VetaB3", **b3attrs)
+                yield etree.Element("VetaB3", **b3attrs)
 
         # VetaC - Summary totals
-        obrat23 = f"{czk_round(total_base)}"
+        obrat23 = f"{czk_round_haler(agg.out_base)}"
         veta_c_attrs = {"obrat23": obrat23}
-        if pln23_kh:
-            veta_c_attrs["pln23"] = f"{czk_round(pln23_kh)}"
-        if pln5_kh:
-            veta_c_attrs["pln5"] = f"{czk_round(pln5_kh)}"
-        veta_c = etree.SubElement(dhkh1, "VetaC", **veta_c_attrs)
-        
-        # Kontrola - File control/checksum
+        if agg.kh_pln23:
+            veta_c_attrs["pln23"] = f"{czk_round_haler(agg.kh_pln23)}"
+        if agg.kh_pln5:
+            veta_c_attrs["pln5"] = f"{czk_round_haler(agg.kh_pln5)}"
+        yield etree.Element("VetaC", **veta_c_attrs)
+
+    def _kontrola(self, agg: TaxAggregates, length: int, checksum: str) -> etree._Element:
         # Generate filename: DPHKH1-{DIC with leading zero}-{YYYYMMDD}-{HHMMSS}
         # DIC should be 10 digits with leading zero if needed
-        dic_formatted = final_taxpayer_dic.zfill(10)
+        dic_formatted = self._final_taxpayer_dic(agg).zfill(10)
         file_date = datetime.now().strftime("%Y%m%d")
         file_time = datetime.now().strftime("%H%M%S")
         filename = f"DPHKH1-{dic_formatted}-{file_date}-{file_time}"
-        
-        # Calculate checksum - need to serialize DPHKH1 element only
-        xml_str = etree.tostring(dhkh1, encoding="utf-8", xml_declaration=False)
-        file_length = len(xml_str)
-        checksum = hashlib.md5(xml_str).hexdigest()
-        
-        kontrola = etree.SubElement(root, "Kontrola")
-        soubor = etree.SubElement(
+
+        kontrola = etree.Element("Kontrola")
+        etree.SubElement(
             kontrola,
             "Soubor",
-            Delka=str(file_length),
+            Delka=str(length),
             KC=checksum,
             Nazev=filename,
             c_ufo=self.taxpayer_ufo,
         )
-        
+        return kontrola
+
+    def build_tree(
+        self,
+        invoices: Iterable[ParsedInvoice],
+        period_from: date,
+        period_to: date,
+        expenses: Optional[Iterable[ParsedExpense]] = None,
+        aggregates: Optional[TaxAggregates] = None,
+        correction: Optional[Correction] = None,
+    ) -> etree._ElementTree:
+        """
+        Pass `aggregates` to reuse totals already computed for DPH, and
+        `correction` for a následné KH.
+        """
+        agg = aggregates or TaxAggregates.compute(invoices, expenses)
+
+        # Root: Pisemnost
+        root = etree.Element("Pisemnost", **self.PISEMNOST_ATTRS)
+
+        # DPHKH1 document
+        dhkh1 = etree.SubElement(root, "DPHKH1", verzePis="03.01")
+        dhkh1.extend(self.records(agg, period_from, period_to, correction))
+
+        # Kontrola - checksum over the serialized DPHKH1 element only
+        xml_str = etree.tostring(dhkh1, encoding="utf-8", xml_declaration=False)
+        root.append(self._kontrola(agg, len(xml_str), hashlib.md5(xml_str).hexdigest()))
+
         return etree.ElementTree(root)
 
+    def write_file(
+        self,
+        path: str,
+        invoices: Iterable[ParsedInvoice],
+        period_from: date,
+        period_to: date,
+        expenses: Optional[Iterable[ParsedExpense]] = None,
+        aggregates: Optional[TaxAggregates] = None,
+        correction: Optional[Correction] = None,
+    ) -> None:
+        """
+        Stream the KH straight to `path`: rows are serialized once, as they
+        are produced, while a running MD5 / byte count over the DPHKH1
+        element yields `Kontrola`. The output tree is never materialized
+        (the aggregates still hold every invoice and KH row).
+        Output is byte-identical to `save(build_tree(...))`; the file is
+        replaced atomically.
+        """
+        agg = aggregates or TaxAggregates.compute(invoices, expenses)
+        output.write_form(
+            path,
+            self.PISEMNOST_ATTRS,
+            "DPHKH1",
+            {"verzePis": "03.01"},
+            self.records(agg, period_from, period_to, correction),
+            lambda length, checksum: self._kontrola(agg, length, checksum),
+        )
+
     @staticmethod
     def save(tree: etree._ElementTree, path: str) -> None:
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        # Write XML to string first
-        xml_bytes = etree.tostring(
-            tree.getroot(),
-            encoding="utf-8",
-            xml_declaration=True,
-            pretty_print=False,
-            method="xml",
-        )
-        xml_str = xml_bytes.decode("utf-8")
-        # Ensure XML declaration uses double quotes and uppercase UTF-8
-        if xml_str.startswith("<?xml version='"):
-            xml_str = xml_str.replace("<?xml version='", '<?xml version="', 1).replace("' encoding='", '" encoding="', 1).replace("'?>", '"?>', 1)
-        elif 'encoding="utf-8"' in xml_str:
-            xml_str = xml_str.replace('encoding="utf-8"', 'encoding="UTF-8"', 1)
-        
-        # Write to file
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(xml_str)
+        output.write_bytes(path, output.to_bytes(tree.getroot()))
@@ -1,24 +1,30 @@
 from __future__ import annotations
 
 import hashlib
-import os
 from datetime import date, datetime
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, Optional
 
 from lxml import etree
 
 from parsers.expense_parser import ParsedExpense
 from parsers.invoice_parser import ParsedInvoice
-from xml_generators.czk import czk_ceil_tax, czk_round
+from xml_generators import output
+from xml_generators.aggregates import TaxAggregates
+from xml_generators.corrective import Correction
+from xml_generators.czk import czk_ceil_tax_haler, czk_round_haler
+from xml_generators.periods import period_attrs
+from xml_generators.taxpayer import TaxpayerProfile
 
 
 class DPHGenerator:
     """
     DPH XML generator.
-    
+
     Generates DPHDP3 format matching the official Finanční správa schema.
     """
 
+    PISEMNOST_ATTRS = {"nazevSW": "EPO MF ČR", "verzeSW": "47.3.1"}
+
     def __init__(
         self,
         taxpayer_ico: str,
@@ -39,141 +45,111 @@ class DPHGenerator:
         taxpayer_pracufo: str = "2002",
         taxpayer_okec: str = "631000",
     ) -> None:
-        self.taxpayer_ico = taxpayer_ico
-        self.taxpayer_dic = taxpayer_dic.replace("CZ", "").replace("cz", "")
-        self.taxpayer_name = taxpayer_name
-        self.taxpayer_title = taxpayer_title
-        self.taxpayer_first_name = taxpayer_first_name
-        self.taxpayer_last_name = taxpayer_last_name
-        self.taxpayer_street = taxpayer_street
-        self.taxpayer_house_number = taxpayer_house_number
-        self.taxpayer_house_number_pop = taxpayer_house_number_pop
-        self.taxpayer_city = taxpayer_city
-        self.taxpayer_zip = taxpayer_zip
-        self.taxpayer_country = taxpayer_country
-        self.taxpayer_email = taxpayer_email
-        self.taxpayer_phone = taxpayer_phone
-        self.taxpayer_ufo = taxpayer_ufo
-        self.taxpayer_pracufo = taxpayer_pracufo
-        self.taxpayer_okec = taxpayer_okec
+        self._use_profile(
+            TaxpayerProfile(
+                ico=taxpayer_ico,
+                dic=taxpayer_dic,
+                name=taxpayer_name,
+                title=taxpayer_title,
+                first_name=taxpayer_first_name,
+                last_name=taxpayer_last_name,
+                street=taxpayer_street,
+                house_number=taxpayer_house_number,
+                house_number_pop=taxpayer_house_number_pop,
+                city=taxpayer_city,
+                zip=taxpayer_zip,
+                country=taxpayer_country,
+                email=taxpayer_email,
+                phone=taxpayer_phone,
+                ufo=taxpayer_ufo,
+                pracufo=taxpayer_pracufo,
+                okec=taxpayer_okec,
+            )
+        )
 
-    def build_tree(
+    @classmethod
+    def from_profile(cls, profile: TaxpayerProfile) -> "DPHGenerator":
+        """Generator for an already loaded profile, sharing its cached headers."""
+        gen = cls.__new__(cls)
+        gen._use_profile(profile)
+        return gen
+
+    def _use_profile(self, profile: TaxpayerProfile) -> None:
+        self.profile = profile
+        self.taxpayer_ico = profile.ico
+        self.taxpayer_dic = profile.dic
+        self.taxpayer_name = profile.name
+        self.taxpayer_title = profile.title
+        self.taxpayer_first_name = profile.first_name
+        self.taxpayer_last_name = profile.last_name
+        self.taxpayer_street = profile.street
+        self.taxpayer_house_number = profile.house_number
+        self.taxpayer_house_number_pop = profile.house_number_pop
+        self.taxpayer_city = profile.city
+        self.taxpayer_zip = profile.zip
+        self.taxpayer_country = profile.country
+        self.taxpayer_email = profile.email
+        self.taxpayer_phone = profile.phone
+        self.taxpayer_ufo = profile.ufo
+        self.taxpayer_pracufo = profile.pracufo
+        self.taxpayer_okec = profile.okec
+
+    def _final_taxpayer_dic(self, agg: TaxAggregates) -> str:
+        # Use taxpayer_dic from first invoice if available, otherwise fall back to config
+        return agg.taxpayer_dic or self.taxpayer_dic
+
+    def records(
         self,
-        invoices: Iterable[ParsedInvoice],
+        agg: TaxAggregates,
         period_from: date,
         period_to: date,
-        expenses: Optional[Iterable[ParsedExpense]] = None,
-    ) -> etree._ElementTree:
-        # Get taxpayer_dic from first invoice if available
-        invoice_list = list(invoices)
-        taxpayer_dic_from_invoice = None
-        if invoice_list:
-            first_inv = invoice_list[0]
-            if first_inv.taxpayer_dic:
-                taxpayer_dic_from_invoice = first_inv.taxpayer_dic.replace("CZ", "").replace("cz", "")
-        
-        # Use taxpayer_dic from invoice if available, otherwise fall back to config
-        final_taxpayer_dic = taxpayer_dic_from_invoice or self.taxpayer_dic
-        
-        # Root: Pisemnost
-        root = etree.Element("Pisemnost", nazevSW="EPO MF ČR", verzeSW="47.3.1")
-        
-        # DPHDP3 document
-        dphdp3 = etree.SubElement(root, "DPHDP3", verzePis="03.01")
-        
+        correction: Optional[Correction] = None,
+    ) -> Iterator[etree._Element]:
+        """DPHDP3 children in document order."""
         # VetaD - Document header
-        month = period_from.month
         year = period_from.year
         submission_date = datetime.now().strftime("%d.%m.%Y")
-        veta_d = etree.SubElement(
-            dphdp3,
-            "VetaD",
+        veta_d = dict(
             c_okec=self.taxpayer_okec,
             d_poddp=submission_date,
-            dapdph_forma="B",
+            # řádné, or dodatečné when correcting a filed return
+            dapdph_forma="D" if correction else "B",
             dokument="DP3",
             k_uladis="DPH",
-            mesic=str(month),
+            **period_attrs(period_from, period_to),
             rok=str(year),
             trans="A",
             typ_platce="P",
         )
-        
-        # VetaP - Taxpayer info
-        # Parse name if not provided separately
-        first_name = self.taxpayer_first_name
-        last_name = self.taxpayer_last_name
-        title = self.taxpayer_title
-        
-        if not first_name and not last_name:
-            # Try to parse title and name from taxpayer_name
-            name_parts = self.taxpayer_name.split()
-            common_titles = ["Ing.", "Mgr.", "Bc.", "MUDr.", "JUDr.", "Dr.", "PhDr.", "RNDr."]
-            
-            if len(name_parts) >= 3 and name_parts[0] in common_titles:
-                # Title + first + last
-                if not title:
-                    title = name_parts[0]
-                first_name = name_parts[1]
-                last_name = " ".join(name_parts[2:])
-            elif len(name_parts) == 2:
-                first_name = name_parts[0]
-                last_name = name_parts[1]
-            else:
-                first_name = self.taxpayer_name
-                last_name = ""
-        
-        # Format title (remove period if present for VetaP)
-        title_formatted = title.rstrip(".") if title else ""
-        
-        veta_p = etree.SubElement(
-            dphdp3,
-            "VetaP",
-            c_orient=self.taxpayer_house_number_pop or "",
-            c_pop=self.taxpayer_house_number or "",
-            c_telef=self.taxpayer_phone or "",
-            c_ufo=self.taxpayer_ufo,
-            c_pracufo=self.taxpayer_pracufo,
-            dic=final_taxpayer_dic,
-            email=self.taxpayer_email or "",
-            jmeno=first_name,
-            naz_obce=self.taxpayer_city or "",
-            prijmeni=last_name,
-            psc=self.taxpayer_zip or "",
-            stat=self.taxpayer_country,
-            titul=title_formatted,
-            typ_ds="F",
-            ulice=self.taxpayer_street or "",
+        if correction:
+            veta_d["d_zjist"] = correction.d_zjist
+        yield etree.Element("VetaD", veta_d)
+
+        # VetaP - Taxpayer info (cached on the profile)
+        yield etree.Element(
+            "VetaP", self.profile.veta_p_attrs("DPHDP3", self._final_taxpayer_dic(agg))
         )
-        
-        # Calculate totals from all invoices
-        total_base = 0.0
-        total_vat = 0.0
-        
-        for inv in invoice_list:
-            total_base += inv.vat_base
-            total_vat += inv.vat_amount
 
-        expense_list: List[ParsedExpense] = list(expenses or [])
-        exp_base_21 = sum(e.base_21 for e in expense_list)
-        exp_vat_21 = sum(e.vat_21 for e in expense_list)
-        exp_base_12 = sum(e.base_12 for e in expense_list)
-        exp_vat_12 = sum(e.vat_12 for e in expense_list)
-        input_vat_total = exp_vat_21 + exp_vat_12
-        
+        # Totals (exact, in haléře)
+        total_base = agg.out_base
+        total_vat = agg.out_vat
+        exp_base_21 = agg.in_base_21
+        exp_vat_21 = agg.in_vat_21
+        exp_base_12 = agg.in_base_12
+        exp_vat_12 = agg.in_vat_12
+
         # Veta1 - Totals (whole CZK; daň rounded up)
-        obrat23 = f"{czk_round(total_base)}"
-        dan23 = f"{czk_ceil_tax(total_vat)}"
-        veta1 = etree.SubElement(
-            dphdp3,
+        obrat23 = f"{czk_round_haler(total_base)}"
+        dan23 = f"{czk_ceil_tax_haler(total_vat)}"
+        yield etree.Element(
             "Veta1",
             dan23=dan23,
             obrat23=obrat23,
         )
 
         # Veta4 - nárok na odpočet (ř. 40–46): přijatá plnění tuzemsko
-        odp_r40 = czk_ceil_tax(exp_vat_21) if exp_vat_21 else 0
-        odp_r41 = czk_ceil_tax(exp_vat_12) if exp_vat_12 else 0
+        odp_r40 = czk_ceil_tax_haler(exp_vat_21)
+        odp_r41 = czk_ceil_tax_haler(exp_vat_12)
         # ř. 42–45 odpočet „V plné výši“ (jen pokud někdy doplníte dovoz / ZDP / §75)
         odp_r42 = odp_r43 = odp_r44 = odp_r45 = 0
         odp_sum_nar = odp_r40 + odp_r41 + odp_r42 + odp_r43 + odp_r44 + odp_r45
@@ -181,18 +157,18 @@ class DPHGenerator:
 
         veta4_attrs: dict[str, str] = {}
         if exp_base_21 or odp_r40:
-            veta4_attrs["pln23"] = f"{czk_round(exp_base_21)}"
+            veta4_attrs["pln23"] = f"{czk_round_haler(exp_base_21)}"
             if odp_r40:
                 veta4_attrs["odp_tuz23_nar"] = f"{odp_r40}"
         if exp_base_12 or odp_r41:
-            veta4_attrs["pln5"] = f"{czk_round(exp_base_12)}"
+            veta4_attrs["pln5"] = f"{czk_round_haler(exp_base_12)}"
             if odp_r41:
                 veta4_attrs["odp_tuz5_nar"] = f"{odp_r41}"
         if odp_sum_nar or odp_sum_kr:
             veta4_attrs["odp_sum_nar"] = f"{odp_sum_nar}"
             veta4_attrs["odp_sum_kr"] = f"{odp_sum_kr}"
         if veta4_attrs:
-            etree.SubElement(dphdp3, "Veta4", **veta4_attrs)
+            yield etree.Element("Veta4", **veta4_attrs)
 
         # ř. 52 / 53 (Veta5) a ř. 60 – jen pokud uplatňujete krácení / vypořádání / úpravu odpočtu
         odp_r52 = 0
@@ -200,19 +176,19 @@ class DPHGenerator:
         odp_r60 = 0
 
         # Veta6 - ř. 62–65 (ř. 63 = ř.46 V plné výši + 52 + 53 + 60)
-        out_vat = czk_ceil_tax(total_vat)
+        out_vat = czk_ceil_tax_haler(total_vat)
         in_vat = odp_sum_nar + odp_r52 + odp_r53 + odp_r60
         dan_zocelk = str(out_vat)
         odp_zocelk = str(in_vat)
-        dano = "0"
+        # ř. 66: change against the last filed tax (dodatečné only)
+        dano = str(out_vat - in_vat - correction.previous_tax) if correction else "0"
         if out_vat >= in_vat:
             dano_da = str(out_vat - in_vat)
             dano_no = "0"
         else:
             dano_da = "0"
             dano_no = str(in_vat - out_vat)
-        veta6 = etree.SubElement(
-            dphdp3,
+        yield etree.Element(
             "Veta6",
             dan_zocelk=dan_zocelk,
             dano=dano,
@@ -220,48 +196,78 @@ class DPHGenerator:
             dano_no=dano_no,
             odp_zocelk=odp_zocelk,
         )
-        
-        # Kontrola - File control/checksum
-        dic_formatted = final_taxpayer_dic.zfill(10)
+
+
+    def _kontrola(self, agg: TaxAggregates, length: int, checksum: str) -> etree._Element:
+        dic_formatted = self._final_taxpayer_dic(agg).zfill(10)
         file_date = datetime.now().strftime("%Y%m%d")
         file_time = datetime.now().strftime("%H%M%S")
         filename = f"DPHDP3-{dic_formatted}-{file_date}-{file_time}"
-        
-        # Calculate checksum - serialize DPHDP3 element only
-        xml_str = etree.tostring(dphdp3, encoding="utf-8", xml_declaration=False)
-        file_length = len(xml_str)
-        checksum = hashlib.md5(xml_str).hexdigest()
-        
-        kontrola = etree.SubElement(root, "Kontrola")
-        soubor = etree.SubElement(
+
+        kontrola = etree.Element("Kontrola")
+        etree.SubElement(
             kontrola,
             "Soubor",
-            Delka=str(file_length),
+            Delka=str(length),
             KC=checksum,
             Nazev=filename,
             c_ufo=self.taxpayer_ufo,
         )
-        
+        return kontrola
+
+    def build_tree(
+        self,
+        invoices: Iterable[ParsedInvoice],
+        period_from: date,
+        period_to: date,
+        expenses: Optional[Iterable[ParsedExpense]] = None,
+        aggregates: Optional[TaxAggregates] = None,
+        correction: Optional[Correction] = None,
+    ) -> etree._ElementTree:
+        """
+        Pass `aggregates` to reuse totals already computed for KH, and
+        `correction` for a dodatečné return.
+        """
+        agg = aggregates or TaxAggregates.compute(invoices, expenses)
+
+        # Root: Pisemnost
+        root = etree.Element("Pisemnost", **self.PISEMNOST_ATTRS)
+
+        # DPHDP3 document
+        dphdp3 = etree.SubElement(root, "DPHDP3", verzePis="03.01")
+        dphdp3.extend(self.records(agg, period_from, period_to, correction))
+
+        # Kontrola - checksum over the serialized DPHDP3 element only
+        xml_str = etree.tostring(dphdp3, encoding="utf-8", xml_declaration=False)
+        root.append(self._kontrola(agg, len(xml_str), hashlib.md5(xml_str).hexdigest()))
+
         return etree.ElementTree(root)
 
+    def write_file(
+        self,
+        path: str,
+        invoices: Iterable[ParsedInvoice],
+        period_from: date,
+        period_to: date,
+        expenses: Optional[Iterable[ParsedExpense]] = None,
+        aggregates: Optional[TaxAggregates] = None,
+        correction: Optional[Correction] = None,
+    ) -> None:
+        """
+        Serialize straight to `path` (same signature as `DHKGenerator.write_file`);
+        `Kontrola` is computed from the bytes as they are written and the
+        output tree is never materialized.
+        """
+        agg = aggregates or TaxAggregates.compute(invoices, expenses)
+        output.write_form(
+            path,
+            self.PISEMNOST_ATTRS,
+            "DPHDP3",
+            {"verzePis": "03.01"},
+            self.records(agg, period_from, period_to, correction),
+            lambda length, checksum: self._kontrola(agg, length, checksum),
+        )
+
     @staticmethod
     def save(tree: etree._ElementTree, path: str) -> None:
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        # Write XML to string first
-        xml_bytes = etree.tostring(
-            tree.getroot(),
-            encoding="utf-8",
-            xml_declaration=True,
-            pretty_print=False,
-            method="xml",
-        )
-        xml_str = xml_bytes.decode("utf-8")
-        # Ensure XML declaration uses double quotes and uppercase UTF-8
-        if xml_str.startswith("<?xml version='"):
-            xml_str = xml_str.replace("<?xml version='", '<?xml version="', 1).replace("' encoding='", '" encoding="', 1).replace("'?>", '"?>', 1)
-        elif 'encoding="utf-8"' in xml_str:
-            xml_str = xml_str.replace('encoding="utf-8"', 'encoding="UTF-8"', 1)
-        
-        # Write to file
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(xml_str)
+        output.write_bytes(path, output.to_bytes(tree.getroot()))
@@ -0,0 +1,128 @@
+"""
+Build manifest: skip regenerating periods whose inputs have not changed.
+
+`OUTPUT_DIR/manifest.json` records, per period, a SHA-256 over the parsed
+documents (every model field except the raw invoice lines, which the
+generators never read) and the generator settings (taxpayer profile, EPO
+software versions, `MANIFEST_VERSION`), together with the size and mtime
+of the files written for it. A period whose key matches and whose files
+are untouched is clean: its XML is kept as is, submission date and all.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from parsers.expense_parser import ParsedExpense
+from parsers.invoice_parser import ParsedInvoice
+from xml_generators import output
+from xml_generators.dhk_generator import DHKGenerator
+from xml_generators.dph_generator import DPHGenerator
+from xml_generators.taxpayer import TaxpayerProfile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# bump whenever the generators' output changes for the same inputs
+MANIFEST_VERSION = 1
+
+INVOICE_FIELDS = tuple(f.name for f in dataclasses.fields(ParsedInvoice) if f.name != "lines")
+EXPENSE_FIELDS = tuple(f.name for f in dataclasses.fields(ParsedExpense))
+
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def generator_settings(profile: TaxpayerProfile) -> Dict[str, Any]:
+    """Everything besides the documents that shapes the generated XML."""
+    return {
+        "version": MANIFEST_VERSION,
+        "taxpayer": {
+            f.name: getattr(profile, f.name)
+            for f in dataclasses.fields(profile)
+            if not f.name.startswith("_")
+        },
+        "dph": DPHGenerator.PISEMNOST_ATTRS,
+        "dhk": DHKGenerator.PISEMNOST_ATTRS,
+    }
+
+
+def input_key(
+    invoices: Iterable[ParsedInvoice],
+    expenses: Iterable[ParsedExpense],
+    settings: Dict[str, Any],
+) -> str:
+    """Content hash of one period's inputs (parsed or compact models alike)."""
+    h = hashlib.sha256(_canonical(settings))
+    h.update(b"\ninvoices\n")
+    for inv in invoices:
+        h.update(_canonical([getattr(inv, name) for name in INVOICE_FIELDS]))
+        h.update(b"\n")
+    h.update(b"expenses\n")
+    for exp in expenses:
+        h.update(_canonical([getattr(exp, name) for name in EXPENSE_FIELDS]))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.path = out_dir / MANIFEST_NAME
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, out_dir: Path) -> "BuildManifest":
+        manifest = cls(out_dir)
+        try:
+            with open(manifest.path, "rb") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return manifest
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable build manifest %s: %s", manifest.path, e)
+            return manifest
+        if data.get("version") == MANIFEST_VERSION:
+            manifest.entries = data.get("periods", {})
+        return manifest
+
+    @staticmethod
+    def _stat(path: Path) -> List[int]:
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns]
+
+    def is_current(self, tag: str, key: str, validated: bool = False) -> bool:
+        """True when `tag` was built from `key` and its files are still as written."""
+        entry = self.entries.get(tag)
+        if not entry or entry.get("key") != key:
+            return False
+        if validated and not entry.get("validated"):
+            return False
+        for name, stat in entry["files"]:
+            try:
+                if self._stat(self.out_dir / name) != stat:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def paths(self, tag: str) -> List[Path]:
+        return [self.out_dir / name for name, _ in self.entries[tag]["files"]]
+
+    def record(self, tag: str, key: str, paths: Iterable[Path], validated: bool = False) -> None:
+        self.entries[tag] = {
+            "key": key,
+            "files": [[Path(p).name, self._stat(Path(p))] for p in paths],
+            "validated": validated,
+        }
+
+    def save(self) -> None:
+        data = {"version": MANIFEST_VERSION, "periods": self.entries}
+        output.write_bytes(str(self.path), json.dumps(data, indent=1, sort_keys=True).encode())
@@ -0,0 +1,97 @@
+"""
+Writing EPO forms (DPH, KH) to disk.
+
+Each document is serialized exactly once, straight to bytes, with the
+declaration EPO expects (`<?xml version="1.0" encoding="UTF-8"?>`), and
+lands in place atomically: it is written to a temporary file next to the
+target and renamed over it, so a crash never leaves a truncated form behind.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator
+
+from lxml import etree
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+@contextmanager
+def atomic_open(path: str) -> Iterator[BinaryIO]:
+    """Binary file that replaces `path` on successful exit (and is discarded otherwise)."""
+    directory, name = os.path.split(path)
+    os.makedirs(directory or ".", exist_ok=True)
+    # plain exclusive create (not mkstemp) so the file gets the usual umask permissions
+    tmp = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "xb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def to_bytes(root: etree._Element) -> bytes:
+    """Whole document, declaration included, in one serialization."""
+    return XML_DECLARATION + etree.tostring(root, encoding="utf-8")
+
+
+def write_bytes(path: str, data: bytes) -> None:
+    with atomic_open(path) as f:
+        f.write(data)
+
+
+class _ChecksumWriter:
+    """File wrapper counting and hashing the bytes written while `hashing` is set."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.md5 = hashlib.md5()
+        self.length = 0
+        self.hashing = False
+
+    def write(self, data: bytes) -> None:
+        if self.hashing:
+            self.md5.update(data)
+            self.length += len(data)
+        self.f.write(data)
+
+
+def write_form(
+    path: str,
+    pisemnost_attrs: Dict[str, str],
+    form_tag: str,
+    form_attrs: Dict[str, str],
+    records: Iterable[etree._Element],
+    kontrola: Callable[[int, str], etree._Element],
+) -> None:
+    """
+    Stream `<Pisemnost><form_tag>records…</form_tag><Kontrola/></Pisemnost>`
+    to `path`. Records are serialized once, as they come; the bytes of the
+    form element are hashed on the way out, and `kontrola(length, md5)`
+    builds the trailing `Kontrola` from them – same values as hashing
+    `etree.tostring(form_element)` separately.
+    """
+    with atomic_open(path) as f:
+        f.write(XML_DECLARATION)
+        out = _ChecksumWriter(f)
+        with etree.xmlfile(out, encoding="utf-8") as xf:
+            with xf.element("Pisemnost", pisemnost_attrs):
+                xf.flush()
+                out.hashing = True
+                with xf.element(form_tag, form_attrs):
+                    for record in records:
+                        xf.write(record)
+                xf.flush()
+                out.hashing = False
+                xf.write(kontrola(out.length, out.md5.hexdigest()))
@@ -0,0 +1,26 @@
+"""Tax period helpers shared by the DPH and KH generators."""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict
+
+
+def is_quarter(period_from: date, period_to: date) -> bool:
+    """[period_from, period_to) is a whole calendar quarter."""
+    months = (period_to.year - period_from.year) * 12 + period_to.month - period_from.month
+    return period_from.day == 1 and period_from.month % 3 == 1 and months == 3
+
+
+def period_attrs(period_from: date, period_to: date) -> Dict[str, str]:
+    """`mesic` for monthly filers, `ctvrt` for quarterly ones (VetaD)."""
+    if is_quarter(period_from, period_to):
+        return {"ctvrt": str((period_from.month - 1) // 3 + 1)}
+    return {"mesic": str(period_from.month)}
+
+
+def period_tag(period_from: date, period_to: date) -> str:
+    """File name suffix: `YYYYMM`, or `YYYYQn` for a quarter."""
+    if is_quarter(period_from, period_to):
+        return f"{period_from.year}Q{(period_from.month - 1) // 3 + 1}"
+    return period_from.strftime("%Y%m")
@@ -0,0 +1,177 @@
+"""
+Taxpayer identity shared by the DPH and KH generators.
+
+A `TaxpayerProfile` is read once – from the environment (`.env` included)
+or from a profile file in the same `KEY=value` format, one per taxpayer –
+and computes its form headers once: the name split into title / first /
+last name and the `VetaP` attributes of each form are cached on the
+profile, so generating many periods (or many taxpayers, one profile each)
+does not redo that work per document.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Mapping, Optional, Tuple
+
+from dotenv import dotenv_values
+
+from config.settings import TAXPAYER_PROFILE
+
+# profile field -> environment / profile file key
+ENV_KEYS = {
+    "ico": "TAXPAYER_ICO",
+    "dic": "TAXPAYER_DIC",
+    "name": "TAXPAYER_NAME",
+    "title": "TAXPAYER_TITLE",
+    "first_name": "TAXPAYER_FIRST_NAME",
+    "last_name": "TAXPAYER_LAST_NAME",
+    "street": "TAXPAYER_STREET",
+    "house_number": "TAXPAYER_HOUSE_NUMBER",
+    "house_number_pop": "TAXPAYER_HOUSE_NUMBER_POP",
+    "city": "TAXPAYER_CITY",
+    "zip": "TAXPAYER_ZIP",
+    "email": "TAXPAYER_EMAIL",
+    "phone": "TAXPAYER_PHONE",
+    "ufo": "TAXPAYER_UFO",
+    "pracufo": "TAXPAYER_PRACUFO",
+    "okec": "TAXPAYER_OKEC",
+}
+
+COMMON_TITLES = ("Ing.", "Mgr.", "Bc.", "MUDr.", "JUDr.", "Dr.", "PhDr.", "RNDr.")
+
+
+@dataclass
+class TaxpayerProfile:
+    ico: str
+    dic: str
+    name: str
+    title: str = ""
+    first_name: str = ""
+    last_name: str = ""
+    street: str = ""
+    house_number: str = ""
+    house_number_pop: str = ""
+    city: str = ""
+    zip: str = ""
+    country: str = "ČESKÁ REPUBLIKA"
+    email: str = ""
+    phone: str = ""
+    ufo: str = "451"
+    pracufo: str = "2002"
+    okec: str = "631000"
+    _names: Optional[Tuple[str, str, str]] = field(default=None, init=False, repr=False, compare=False)
+    _veta_p: Dict[str, Dict[str, str]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Strip CZ prefix if present
+        self.dic = self.dic.replace("CZ", "").replace("cz", "")
+
+    @classmethod
+    def from_mapping(cls, values: Mapping[str, Optional[str]], source: str = "env/.env") -> "TaxpayerProfile":
+        kwargs = {f: values[key] for f, key in ENV_KEYS.items() if values.get(key) is not None}
+        if not (kwargs.get("ico") and kwargs.get("dic") and kwargs.get("name")):
+            raise RuntimeError(f"Set TAXPAYER_ICO, TAXPAYER_DIC and TAXPAYER_NAME in {source}")
+        return cls(**kwargs)
+
+    @classmethod
+    def from_env(cls) -> "TaxpayerProfile":
+        """From the environment (`config.settings` has already loaded `.env`)."""
+        return cls.from_mapping(os.environ)
+
+    @classmethod
+    def from_file(cls, path: str) -> "TaxpayerProfile":
+        """From a `KEY=value` profile file (same keys as `.env`); the environment is not consulted."""
+        if not os.path.isfile(path):
+            raise RuntimeError(f"Taxpayer profile {path} not found")
+        return cls.from_mapping(dotenv_values(path), source=path)
+
+    @property
+    def names(self) -> Tuple[str, str, str]:
+        """(title, first name, last name); parsed from `name` when not given separately."""
+        if self._names is None:
+            first_name = self.first_name
+            last_name = self.last_name
+            title = self.title
+            if not first_name and not last_name:
+                # Try to parse title and name from the full name
+                name_parts = self.name.split()
+                if len(name_parts) >= 3 and name_parts[0] in COMMON_TITLES:
+                    # Title + first + last
+                    if not title:
+                        title = name_parts[0]
+                    first_name = name_parts[1]
+                    last_name = " ".join(name_parts[2:])
+                elif len(name_parts) == 2:
+                    first_name = name_parts[0]
+                    last_name = name_parts[1]
+                else:
+                    first_name = self.name
+                    last_name = ""
+            self._names = (title, first_name, last_name)
+        return self._names
+
+    def veta_p_attrs(self, form: str, dic: Optional[str] = None) -> Dict[str, str]:
+        """
+        `VetaP` attributes for `form` ("DPHDP3" or "DPHKH1"), built once per
+        profile. `dic` overrides the profile's DIČ (the one on the invoices
+        wins). The returned dict may be shared – do not modify it.
+        """
+        attrs = self._veta_p.get(form)
+        if attrs is None:
+            attrs = self._veta_p[form] = self._build_veta_p(form)
+        if dic and dic != attrs["dic"]:
+            attrs = dict(attrs, dic=dic)
+        return attrs
+
+    def _build_veta_p(self, form: str) -> Dict[str, str]:
+        title, first_name, last_name = self.names
+        # attribute order is part of the output (and of the Kontrola checksum)
+        if form == "DPHDP3":
+            return {
+                "c_orient": self.house_number_pop or "",
+                "c_pop": self.house_number or "",
+                "c_telef": self.phone or "",
+                "c_ufo": self.ufo,
+                "c_pracufo": self.pracufo,
+                "dic": self.dic,
+                "email": self.email or "",
+                "jmeno": first_name,
+                "naz_obce": self.city or "",
+                "prijmeni": last_name,
+                "psc": self.zip or "",
+                "stat": self.country,
+                # title without trailing period in DPH
+                "titul": title.rstrip(".") if title else "",
+                "typ_ds": "F",
+                "ulice": self.street or "",
+            }
+        if form == "DPHKH1":
+            return {
+                "c_ufo": self.ufo,
+                "c_pracufo": self.pracufo,
+                "dic": self.dic,
+                "typ_ds": "F",
+                "titul": title or "",
+                "jmeno": first_name,
+                "prijmeni": last_name,
+                "ulice": self.street or "",
+                "c_orient": self.house_number or "",
+                "c_pop": self.house_number_pop or "",
+                "naz_obce": self.city or "",
+                "psc": self.zip or "",
+                "stat": self.country,
+                "email": self.email or "",
+                "c_telef": self.phone or "",
+            }
+        raise ValueError(f"Unknown form {form!r}")
+
+
+@lru_cache(maxsize=None)
+def load_profile(path: str = TAXPAYER_PROFILE) -> TaxpayerProfile:
+    """Profile from `path` (default: TAXPAYER_PROFILE), else from env/.env; loaded once per path."""
+    if path:
+        return TaxpayerProfile.from_file(path)
+    return TaxpayerProfile.from_env()
@@ -0,0 +1,92 @@
+"""
+Optional XSD validation of generated DPH / KH files.
+
+The DPHDP3 / DPHKH1 schemas are read from `XSD_DIR`. The default,
+`xml_generators/schemas`, ships structure schemas for the sentences this
+project generates; point `XSD_DIR` at the official EPO files for the full
+check. Schemas are compiled once per process: `load_schema` is memoized,
+and `preload_schemas` compiles them up front – in the parent before worker
+processes fork (they inherit the compiled schemas) and as the pool
+initializer (so spawned workers compile once, not per file).
+"""
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from lxml import etree
+
+from config.settings import XSD_DIR
+
+SCHEMA_DIR = XSD_DIR or os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+# form element -> schema file as published on the EPO portal
+SCHEMA_FILES = {
+    "DPHDP3": "dphdp3_epo2.xsd",
+    "DPHKH1": "dphkh1_epo2.xsd",
+}
+
+
+class SchemaValidationError(Exception):
+    """A generated file does not match its form's XSD."""
+
+    def __init__(self, path: str, errors: List[str]) -> None:
+        super().__init__(f"{path} does not match its schema: " + "; ".join(errors[:5]))
+        self.path = path
+        self.errors = errors
+
+
+def schema_path(form: str) -> str:
+    try:
+        return os.path.join(SCHEMA_DIR, SCHEMA_FILES[form])
+    except KeyError:
+        raise ValueError(f"No schema known for form {form!r}") from None
+
+
+def missing_schemas(forms: Iterable[str] = tuple(SCHEMA_FILES)) -> List[str]:
+    """Schema files `preload_schemas` would not find (checked before any download)."""
+    return [path for path in map(schema_path, forms) if not os.path.isfile(path)]
+
+
+@lru_cache(maxsize=None)
+def load_schema(form: str) -> Tuple[etree.XMLSchema, bool]:
+    """
+    Compiled schema for `form` and whether it declares the `Pisemnost`
+    envelope (then whole files are validated, otherwise the form element).
+    """
+    path = schema_path(form)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"Schema {path} not found – download {SCHEMA_FILES[form]} from the EPO portal "
+            f"(structure descriptions) into {SCHEMA_DIR} or set XSD_DIR"
+        )
+    doc = etree.parse(path)
+    top_level = doc.getroot().xpath(
+        "xs:element/@name", namespaces={"xs": "http://www.w3.org/2001/XMLSchema"}
+    )
+    return etree.XMLSchema(doc), "Pisemnost" in top_level
+
+
+def preload_schemas(forms: Iterable[str] = tuple(SCHEMA_FILES)) -> None:
+    """Compile the schemas now (fails early on a missing / broken XSD)."""
+    for form in forms:
+        load_schema(form)
+
+
+def validate_tree(root: etree._Element, path: str = "<document>") -> None:
+    """Validate a `Pisemnost` tree; raises `SchemaValidationError`."""
+    form_element = next((child for child in root if child.tag in SCHEMA_FILES), None)
+    if form_element is None:
+        raise SchemaValidationError(path, [f"no {' / '.join(SCHEMA_FILES)} element"])
+    schema, whole_document = load_schema(form_element.tag)
+    if not schema.validate(root if whole_document else form_element):
+        raise SchemaValidationError(
+            path, [f"line {e.line}: {e.message}" for e in schema.error_log]
+        )
+
+
+def validate_file(path: str) -> None:
+    """Validate a generated DPH / KH file; raises `SchemaValidationError`."""
+    validate_tree(etree.parse(path).getroot(), path)